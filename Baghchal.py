@@ -1,6 +1,8 @@
 import numpy as np
 from collections import Counter
 import copy
+from Zobrist import ZOBRIST_GOAT, ZOBRIST_TIGER, zobrist_hash
+from BoardTables import POINTS, DIRECTIONS_FROM, STEPS
 
 
 # Class to represent the Baghchal game
@@ -16,16 +18,31 @@ class Baghchal:
         for x, y in self.tigers:
             self.board[x, y] = 'T'     
 
+        # Points (x * 5 + y) with a goat and empty points, kept up to date by every move
+        # so move generation does not have to scan the board
+        self.goat_cells = set()
+        self.empty_cells = set(range(25)) - {x * 5 + y for x, y in self.tigers}
+
         self.goats = 20
         self.goats_on_board = 0
         self.current_player = 'goat'  
         self.captured_goats = 0
 
+        # Zobrist hash of the board, updated on every move
+        self.zobrist_key = zobrist_hash([], self.tigers)
+
         # Track board states to check for draw conditions
+        # The key is the Zobrist hash of the board
         self.state_history = Counter() 
         # Track moves without progress 
         self.moves_since_progress = 0 
 
+        # Tiger moves and terminal status of the current position, see update_status
+        self.terminal_reason = None
+        self.winner = None
+        self.tiger_moves = self.get_moves_for_tigers()
+        self.update_status()
+
 
     # Function to print the board
     def print_board(self):
@@ -34,11 +51,13 @@ class Baghchal:
 
 
     # Function to check if the tigers are blocked
+    # The tiger moves are generated once per move by apply_move and kept in tiger_moves
     def are_tigers_blocked(self):
-        for tiger in self.tigers:
-            if self.get_adjacent_moves(*tiger, jump=True):
-                return False
-        return True
+        return not self.tiger_moves
+
+    # Points (x * 5 + y) of the goats and of the tigers
+    def piece_points(self):
+        return list(self.goat_cells), [x * 5 + y for x, y in self.tigers]
 
     # Function to clone the current state
     # This is used to simulate the effect of a move without changing the current state
@@ -47,13 +66,47 @@ class Baghchal:
         new_clone = Baghchal()
         new_clone.board = np.copy(self.board)  
         new_clone.tigers = copy.deepcopy(self.tigers)  
+        new_clone.goat_cells = set(self.goat_cells)
+        new_clone.empty_cells = set(self.empty_cells)
         new_clone.goats = self.goats
         new_clone.goats_on_board = self.goats_on_board
         new_clone.current_player = self.current_player
         new_clone.captured_goats = self.captured_goats
+        new_clone.zobrist_key = self.zobrist_key
         new_clone.state_history = copy.deepcopy(self.state_history)
         new_clone.moves_since_progress = self.moves_since_progress
+        new_clone.tiger_moves = self.tiger_moves
+        new_clone.terminal_reason = self.terminal_reason
+        new_clone.winner = self.winner
         return new_clone
+
+
+    # Compact form of the state made only of strings, ints and tuples
+    # It is small to pickle and can be loaded by either game engine with from_compact
+    # The board is a string of 25 characters, row by row
+    def to_compact(self):
+        return ("".join(self.board.flat), self.current_player, self.goats, self.goats_on_board,
+                self.captured_goats, self.moves_since_progress, tuple(self.state_history.items()))
+
+    # Build a state from the compact form returned by to_compact
+    @classmethod
+    def from_compact(cls, compact):
+        board, current_player, goats, goats_on_board, captured_goats, moves_since_progress, history = compact
+        state = cls()
+        state.board = np.array(list(board), dtype=object).reshape(5, 5)
+        state.tigers = [divmod(i, 5) for i, cell in enumerate(board) if cell == 'T']
+        state.goat_cells = {i for i, cell in enumerate(board) if cell == 'G'}
+        state.empty_cells = {i for i, cell in enumerate(board) if cell == '.'}
+        state.zobrist_key = zobrist_hash([divmod(i, 5) for i, cell in enumerate(board) if cell == 'G'], state.tigers)
+        state.current_player = current_player
+        state.goats = goats
+        state.goats_on_board = goats_on_board
+        state.captured_goats = captured_goats
+        state.moves_since_progress = moves_since_progress
+        state.state_history = Counter(dict(history))
+        state.tiger_moves = state.get_moves_for_tigers()
+        state.update_status()
+        return state
     
 
     # Get valid moves for the current player
@@ -66,14 +119,15 @@ class Baghchal:
         if self.current_player == 'goat':
             # If goats are not on board, place them on empty cells
             if self.goats > 0:
-                moves = [(x, y) for x in range(5) for y in range(5) if self.board[x, y] == '.']
+                moves = [POINTS[i] for i in sorted(self.empty_cells)]
             # If goats are on board, move to adjacent empty cells
             else:
                 moves = self.get_moves_for_goats()
         # Get possible moves for the tiger
         # Tigers can move to adjacent empty cells or jump over goats
+        # They were already generated by the last move, the list must not be changed by the caller
         else:
-            moves = self.get_moves_for_tigers()
+            moves = self.tiger_moves
         return moves
     
 
@@ -81,7 +135,8 @@ class Baghchal:
     # Get moves for goats if they all are on the board
     # Possible moves for goats are to move to adjacent empty cells
     def get_moves_for_goats(self):
-        return [move for x in range(5) for y in range(5) if self.board[x, y] == 'G' for move in self.get_adjacent_moves(x, y)]
+        empty = self.empty_cells
+        return [move for i in self.goat_cells for neighbour, move in STEPS[i] if neighbour in empty]
 
 
     # Get moves for tigers 
@@ -91,52 +146,42 @@ class Baghchal:
 
 
     # Provide valid adjacent moves for a position
+    # The neighbours and jumps of every point come from BoardTables,
+    # the (x + y) % 2 rule for diagonals is already applied there
     def get_adjacent_moves(self, x, y, jump=False):
-        # Define directions for adjacent cells
-        directions = []
-
-        # check if the sum of x and y is odd or even
-        # like (0,0) (1,1) (2,0) (2,2) and many more are even
-        # and (0,1) (1,0) (1,2) (2,1) and many more are odd
-        # for even we can move in 8 directions no need to check for diagonal
-        # for odd we can move in 4 directions, no diagonal possible
-
-        if (x + y) % 2 != 0:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        else:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
-
-
+        empty = self.empty_cells
+        goats = self.goat_cells
         # list to store the possible moves
         moves = []
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            # Check if the new position is within the board and empty
-            # If it is in the board and empty, add it to the list of possible moves
-            if 0 <= nx < 5 and 0 <= ny < 5 and self.board[nx, ny] == '.':
-                moves.append(((x, y), (nx, ny)))
-            # If jump is True, check for possible jumps
-            elif jump:
-                jump_x, jump_y = x + 2 * dx, y + 2 * dy
-                if (
-                    0 <= jump_x < 5
-                    and 0 <= jump_y < 5
-                    and self.board[nx, ny] == 'G'
-                    and self.board[jump_x, jump_y] == '.'
-                ):
-                    moves.append(((x, y), (jump_x, jump_y)))
+        for neighbour, step_move, land, jump_move in DIRECTIONS_FROM[x * 5 + y]:
+            # If the neighbour is empty, add it to the list of possible moves
+            if neighbour in empty:
+                moves.append(step_move)
+            # If jump is True, check for possible jumps over a goat to an empty point
+            elif jump and land != -1 and neighbour in goats and land in empty:
+                moves.append(jump_move)
         return moves
 
 
     # Apply a move to the board
     # The move can be placing a goat or moving a goat or moving a tiger
+    # Returns an undo record that undo_move uses to take the move back
     def apply_move(self, move):
+        # Everything undo_move needs to restore the state before the move
+        # The tigers list is replaced below, not changed, so the old list can be kept as is
+        undo = (move, self.current_player, self.goats, self.goats_on_board, self.captured_goats,
+                self.moves_since_progress, self.zobrist_key, self.tigers,
+                self.tiger_moves, self.terminal_reason, self.winner)
+
         # Apply move for the goar
         if self.current_player == 'goat':
             # If all goats are not on board, place them on empty cells
             if self.goats > 0:  
                 x, y = move
                 self.board[x, y] = 'G'
+                self.goat_cells.add(x * 5 + y)
+                self.empty_cells.discard(x * 5 + y)
+                self.zobrist_key ^= ZOBRIST_GOAT[x * 5 + y]
                 self.goats -= 1
                 self.goats_on_board += 1
             # If all goats are on board, move them to adjacent empty cells
@@ -146,80 +191,150 @@ class Baghchal:
                 # put goat on the destination and remove from source
                 self.board[src_x, src_y] = '.'
                 self.board[dest_x, dest_y] = 'G'
+                self.goat_cells.remove(src_x * 5 + src_y)
+                self.goat_cells.add(dest_x * 5 + dest_y)
+                self.empty_cells.add(src_x * 5 + src_y)
+                self.empty_cells.remove(dest_x * 5 + dest_y)
+                self.zobrist_key ^= ZOBRIST_GOAT[src_x * 5 + src_y] ^ ZOBRIST_GOAT[dest_x * 5 + dest_y]
         # Apply move for the tiger
         else:
              # src are where goat initially were and dest are where goat is moving
             (src_x, src_y), (dest_x, dest_y) = move
             # remove tiger from source
             self.board[src_x, src_y] = '.'
+            self.empty_cells.add(src_x * 5 + src_y)
+            self.zobrist_key ^= ZOBRIST_TIGER[src_x * 5 + src_y] ^ ZOBRIST_TIGER[dest_x * 5 + dest_y]
             # check if tiger is jumping over goat
             if abs(src_x - dest_x) == 2 or abs(src_y - dest_y) == 2:
                 #position of goat that is being jumped over
                 mid_x, mid_y = (src_x + dest_x) // 2, (src_y + dest_y) // 2
                 # remove goat
                 self.board[mid_x, mid_y] = '.'
+                self.goat_cells.remove(mid_x * 5 + mid_y)
+                self.empty_cells.add(mid_x * 5 + mid_y)
+                self.zobrist_key ^= ZOBRIST_GOAT[mid_x * 5 + mid_y]
                 # increment captured goats
                 self.captured_goats += 1
                 # decrement goats on board
                 self.goats_on_board -= 1
             # put tiger on destination
             self.board[dest_x, dest_y] = 'T'
+            self.empty_cells.remove(dest_x * 5 + dest_y)
             # update tiger position
             self.tigers = [(x, y) if (x, y) != (src_x, src_y) else (dest_x, dest_y) for x, y in self.tigers]
 
         # Track board state after the move
-        # Convert the board to a tuple of tuples to make it hashable
-        # and use it as the key in the dictionary
-        board_state = tuple(map(tuple, self.board))
-        # Increment the count of the board state
-        self.state_history[board_state] += 1
+        # The Zobrist hash is already up to date, so it is used as the key
+        self.state_history[self.zobrist_key] += 1
+
+        # Generate the tiger moves once, they tell if the tigers are blocked
+        # and are the possible moves if the tiger plays next
+        self.tiger_moves = self.get_moves_for_tigers()
 
         # Reset progress counter if there's significant progress
         #if goats are captured or tigers are blocked
         if self.current_player == 'tiger' and self.captured_goats > 0:
             self.moves_since_progress = 0
-        elif self.are_tigers_blocked():
+        elif not self.tiger_moves:
             self.moves_since_progress = 0
         else:
             self.moves_since_progress += 1
 
         # Switch player
         self.current_player = 'goat' if self.current_player == 'tiger' else 'tiger'
+        self.update_status()
+        return undo
+
+
+    # Take back a move using the record returned by apply_move
+    # Moves must be undone in the reverse order they were applied
+    def undo_move(self, undo):
+        (move, player, goats, goats_on_board, captured_goats, moves_since_progress, zobrist_key, tigers,
+         tiger_moves, terminal_reason, winner) = undo
+
+        # Remove the board state written by the move from the history
+        self.state_history[self.zobrist_key] -= 1
+        if not self.state_history[self.zobrist_key]:
+            del self.state_history[self.zobrist_key]
+
+        # Put the pieces back
+        if player == 'goat':
+            if goats > 0:
+                x, y = move
+                self.board[x, y] = '.'
+                self.goat_cells.remove(x * 5 + y)
+                self.empty_cells.add(x * 5 + y)
+            else:
+                (src_x, src_y), (dest_x, dest_y) = move
+                self.board[src_x, src_y] = 'G'
+                self.board[dest_x, dest_y] = '.'
+                self.goat_cells.add(src_x * 5 + src_y)
+                self.goat_cells.remove(dest_x * 5 + dest_y)
+                self.empty_cells.remove(src_x * 5 + src_y)
+                self.empty_cells.add(dest_x * 5 + dest_y)
+        else:
+            (src_x, src_y), (dest_x, dest_y) = move
+            self.board[src_x, src_y] = 'T'
+            self.board[dest_x, dest_y] = '.'
+            self.empty_cells.remove(src_x * 5 + src_y)
+            self.empty_cells.add(dest_x * 5 + dest_y)
+            # the goat that was jumped over is put back
+            if captured_goats != self.captured_goats:
+                mid_x, mid_y = (src_x + dest_x) // 2, (src_y + dest_y) // 2
+                self.board[mid_x, mid_y] = 'G'
+                self.goat_cells.add(mid_x * 5 + mid_y)
+                self.empty_cells.remove(mid_x * 5 + mid_y)
+
+        self.current_player = player
+        self.goats = goats
+        self.goats_on_board = goats_on_board
+        self.captured_goats = captured_goats
+        self.moves_since_progress = moves_since_progress
+        self.zobrist_key = zobrist_key
+        self.tigers = tigers
+        self.tiger_moves = tiger_moves
+        self.terminal_reason = terminal_reason
+        self.winner = winner
 
 
     # function to check draw conditions
     # Check if the game has reached a terminal state
     def check_repetition_draw(self):
-        # Check if any state has repeated 3 times
-        for state, count in self.state_history.items():
-            # Check if the board state has repeated 5 times
-            if count >= 5:
-                print("Draw due to repetitive moves!")
-                return True
-        return False
+        # Counts only grow when a state is written, so only the state
+        # written by the last move can have just reached 5 repetitions
+        return self.state_history[self.zobrist_key] >= 5
 
     #if no progress is made in 50 moves
     def check_no_progress_draw(self, limit=50):
         # Check for no progress in a certain number of moves
-        if self.moves_since_progress >= limit:
-            print("Draw due to no progress!")
-            return True
-        return False
+        return self.moves_since_progress >= limit
+
+    # Work out if the current position ends the game, once per move
+    # tiger_moves must already be up to date
+    # terminal_reason is why the game ended: 'captured' (5 goats captured), 'tigers_blocked',
+    # 'repetition' or 'no_progress', and None while the game goes on
+    # winner is 'tiger', 'goat' or None for a draw or a game that is not over
+    def update_status(self):
+        # A game that is already over keeps its result, a move played after the end does not change the winner
+        if self.terminal_reason is not None:
+            return
+        # Check win conditions, the player who just moved wins
+        self.winner = "tiger" if self.current_player == "goat" else "goat"
+        if self.captured_goats >= 5:
+            self.terminal_reason = 'captured'
+        elif not self.tiger_moves:
+            self.terminal_reason = 'tigers_blocked'
+        else:
+            # Check draw conditions
+            self.winner = None
+            if self.check_repetition_draw():
+                self.terminal_reason = 'repetition'
+            elif self.check_no_progress_draw():
+                self.terminal_reason = 'no_progress'
+            else:
+                self.terminal_reason = None
 
     # Check if the game has reached a terminal state
+    # Returns (is terminal, winner), the status is worked out by update_status when the move is applied
     def is_terminal(self):
-        # Check win conditions
-        winner = "tiger" if self.current_player == "goat" else "goat"
-        if self.captured_goats >= 5:
-            return True, winner
-        if self.are_tigers_blocked():
-            return True, winner
-
-        # Check draw conditions
-        if (
-            self.check_repetition_draw()
-            or self.check_no_progress_draw()
-        ):
-            return True, None
-
-        return False, None
\ No newline at end of file
+        return self.terminal_reason is not None, self.winner
@@ -0,0 +1,143 @@
+import numpy as np
+
+from BoardTables import STEPS, JUMPS
+
+# Batched random playouts with NumPy
+# N games are played at the same time, the board of every game is a row of a (N, 25) array
+# Every ply, the legal moves of all the games are found at once as a (N, number of actions) mask,
+# one random legal move is picked per game and all the moves are applied together
+#
+# The rules are the same as Baghchal, except that repeated positions are not tracked
+# Games are instead stopped as draws after max_plies plies
+# The moves are picked uniformly among all the legal moves
+
+EMPTY = 0
+GOAT = 1
+TIGER = 2
+
+# Action space ..............................................
+# Actions 0 to 24 place a goat on that point
+# The next actions move a piece along one edge of the board, from STEP_SRC to STEP_DEST
+# The last actions are tiger jumps from JUMP_SRC over JUMP_OVER to JUMP_LAND
+STEP_SRC = np.array([i for i in range(25) for _ in STEPS[i]])
+STEP_DEST = np.array([neighbour for i in range(25) for neighbour, _ in STEPS[i]])
+JUMP_SRC = np.array([i for i in range(25) for _ in JUMPS[i]])
+JUMP_OVER = np.array([over for i in range(25) for over, _, _ in JUMPS[i]])
+JUMP_LAND = np.array([land for i in range(25) for _, land, _ in JUMPS[i]])
+
+FIRST_STEP = 25
+FIRST_JUMP = FIRST_STEP + len(STEP_SRC)
+ACTIONS = FIRST_JUMP + len(JUMP_SRC)
+
+# Results of a game in the winner array
+DRAW = 0
+TIGER_WIN = 1
+GOAT_WIN = -1
+
+
+# N copies of a game as batch arrays
+# The game can be any engine with piece_points
+# The fields are read directly, to_compact would also copy the position history, which grows with the game
+def batch_from_state(state, n):
+    goat_points, tiger_points = state.piece_points()
+    row = np.full(25, EMPTY, dtype=np.int8)
+    row[goat_points] = GOAT
+    row[tiger_points] = TIGER
+    return {
+        'board': np.tile(row, (n, 1)),
+        'goats': np.full(n, state.goats, dtype=np.int16),
+        'captured': np.full(n, state.captured_goats, dtype=np.int16),
+        'tiger_turn': np.full(n, state.current_player == 'tiger'),
+        'since_progress': np.full(n, state.moves_since_progress, dtype=np.int16),
+    }
+
+
+# Mask of the tiger moves of every game, steps then jumps
+def tiger_moves(board, empty):
+    steps = (board[:, STEP_SRC] == TIGER) & empty[:, STEP_DEST]
+    jumps = (board[:, JUMP_SRC] == TIGER) & (board[:, JUMP_OVER] == GOAT) & empty[:, JUMP_LAND]
+    return steps, jumps
+
+
+# Play every game of the batch to the end with random moves
+# Returns the winner array, one of DRAW, TIGER_WIN, GOAT_WIN per game
+# The batch arrays are changed in place until finished games are dropped, so they should not be used after
+def play_batch(batch, rng, max_plies=200, no_progress_limit=50):
+    board = batch['board']
+    goats = batch['goats']
+    captured = batch['captured']
+    tiger_turn = batch['tiger_turn']
+    since_progress = batch['since_progress']
+    winner = np.full(len(board), DRAW, dtype=np.int8)
+    # Index in the winner array of every row still being played
+    game_index = np.arange(len(board))
+    active = np.ones(len(board), dtype=bool)
+
+    for _ in range(max_plies):
+        # Drop the finished games once they are half of the rows, so the work follows the games left
+        if active.sum() * 2 < len(active):
+            board, goats, captured = board[active], goats[active], captured[active]
+            tiger_turn, since_progress, game_index = tiger_turn[active], since_progress[active], game_index[active]
+            active = active[active]
+        n = len(board)
+        rows = np.arange(n)
+        empty = board == EMPTY
+
+        # Terminal checks, like Baghchal.is_terminal the player who moved last wins
+        steps, jumps = tiger_moves(board, empty)
+        blocked = ~steps.any(axis=1) & ~jumps.any(axis=1)
+        won = active & ((captured >= 5) | blocked)
+        winner[game_index[won]] = np.where(tiger_turn[won], GOAT_WIN, TIGER_WIN)
+        active &= ~won & (since_progress < no_progress_limit)
+        if not active.any():
+            break
+
+        # Legal moves of every game
+        placing = ~tiger_turn & (goats > 0)
+        moving_piece = np.where(tiger_turn, TIGER, GOAT).astype(np.int8)
+        mask = np.zeros((n, ACTIONS), dtype=bool)
+        mask[:, :FIRST_STEP] = empty & placing[:, None]
+        mask[:, FIRST_STEP:FIRST_JUMP] = ((board[:, STEP_SRC] == moving_piece[:, None])
+                                          & empty[:, STEP_DEST] & ~placing[:, None])
+        mask[:, FIRST_JUMP:] = tiger_turn[:, None] & jumps
+        mask &= active[:, None]
+
+        # Goats without moves end the game as a draw, like the simulation in MCTS
+        active &= mask.any(axis=1)
+
+        # Pick a uniform random legal move: the largest random key among the legal actions
+        keys = rng.random((n, ACTIONS), dtype=np.float32)
+        keys[~mask] = -1.0
+        action = keys.argmax(axis=1)
+
+        # Goat placements
+        place = active & (action < FIRST_STEP)
+        board[rows[place], action[place]] = GOAT
+        goats[place] -= 1
+
+        # Steps of goats and tigers
+        step = active & (action >= FIRST_STEP) & (action < FIRST_JUMP)
+        edge = action[step] - FIRST_STEP
+        board[rows[step], STEP_SRC[edge]] = EMPTY
+        board[rows[step], STEP_DEST[edge]] = moving_piece[step]
+
+        # Tiger jumps, the goat jumped over is captured
+        jump = active & (action >= FIRST_JUMP)
+        edge = action[jump] - FIRST_JUMP
+        board[rows[jump], JUMP_SRC[edge]] = EMPTY
+        board[rows[jump], JUMP_OVER[edge]] = EMPTY
+        board[rows[jump], JUMP_LAND[edge]] = TIGER
+        captured[jump] += 1
+
+        # Same progress rule as Baghchal.apply_move
+        # A move that blocks the tigers ends the game at the next terminal check
+        progress = tiger_turn & (captured > 0)
+        since_progress[:] = np.where(progress, 0, since_progress + 1)
+        tiger_turn = ~tiger_turn
+    return winner
+
+
+# Play n random games from a state and return the number of tiger wins, goat wins and draws
+def batch_rollout(state, n, rng, max_plies=200):
+    winner = play_batch(batch_from_state(state, n), rng, max_plies)
+    return int((winner == TIGER_WIN).sum()), int((winner == GOAT_WIN).sum()), int((winner == DRAW).sum())
@@ -0,0 +1,318 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Baghchal import Baghchal
+from BitboardBaghchal import BitboardBaghchal
+from Engines import ENGINES
+from BatchRollout import batch_rollout
+from MCTS import search, simulate, rollout
+from RolloutPolicy import make_policy
+import numpy as np
+from ParallelMCTS import parallel_mcts, tree_parallel_search
+
+# Benchmarks for the game engines and the search
+# Run with: python Benchmark.py [iterations per worker] [max workers]
+# or: python Benchmark.py suite [output file] [iterations...] for the reproducible benchmark suite
+# or: python Benchmark.py compare old.json new.json to compare two suite results
+
+
+# Game after a fixed number of random moves, the same for every run
+def benchmark_position(engine=BitboardBaghchal, moves=10, seed=0):
+    rng = random.Random(seed)
+    game = engine()
+    for _ in range(moves):
+        possible_moves = game.get_possible_moves()
+        if game.is_terminal()[0] or not possible_moves:
+            break
+        game.apply_move(rng.choice(possible_moves))
+    return game
+
+
+# Benchmark suite ...........................................
+# Every number comes from fixed positions and fixed seeds, so two runs on the same machine
+# measure the same work and can be compared between commits and between engines
+SUITE_ITERATIONS = (1000, 10000, 100000)
+# Each throughput is the best of this many timed runs
+REPEATS = 3
+
+
+# First position of seeded random games that matches a condition
+# Games are played with seeds seed, seed + 1, ... until one reaches such a position
+def find_position(engine, condition, seed=0):
+    while True:
+        rng = random.Random(seed)
+        game = engine()
+        while not game.is_terminal()[0]:
+            moves = game.get_possible_moves()
+            if not moves:
+                break
+            if condition(game):
+                return game
+            game.apply_move(rng.choice(moves))
+        seed += 1
+
+
+# Tiger to move with a capture available and one goat left to capture
+def near_capture(game):
+    if game.current_player != 'tiger' or game.captured_goats != 4:
+        return False
+    return any(abs(src[0] - dest[0]) == 2 or abs(src[1] - dest[1]) == 2 for src, dest in game.get_possible_moves())
+
+
+# The fixed positions of the suite: placement phase, movement phase and a near capture endgame
+# They are found with Baghchal and converted, so every engine is measured on the same positions
+def suite_positions(engine):
+    positions = {
+        'placement': benchmark_position(Baghchal),
+        'movement': find_position(Baghchal, lambda game: game.goats == 0 and game.current_player == 'goat'),
+        'near_capture': find_position(Baghchal, near_capture),
+    }
+    return {name: engine.from_compact(game.to_compact()) for name, game in positions.items()}
+
+
+# Best rate of calls per second of fn over REPEATS runs of count calls
+def best_rate(fn, count):
+    best = 0.0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(count):
+            fn()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+# get_possible_moves, apply_move with undo_move, clone and random playouts per second from a position
+# With the tigers to move, get_possible_moves returns the tiger moves apply_move already generated,
+# so get_moves_for_tigers is timed instead, to measure the move generation itself
+def benchmark_engine_position(game, count=2000, playouts=200, seed=0):
+    moves = game.get_possible_moves()
+    move = moves[0]
+    generate_moves = game.get_moves_for_tigers if game.current_player == 'tiger' else game.get_possible_moves
+
+    def apply_and_undo():
+        game.undo_move(game.apply_move(move))
+
+    rng = random.Random(seed)
+    undo_stack = []
+
+    def playout():
+        simulate(game, undo_stack, rng)
+        while undo_stack:
+            game.undo_move(undo_stack.pop())
+
+    return {
+        'moves': len(moves),
+        'get_possible_moves_per_second': best_rate(generate_moves, count),
+        'apply_undo_per_second': best_rate(apply_and_undo, count),
+        'clone_microseconds': 1e6 / best_rate(game.clone, count),
+        'playouts_per_second': best_rate(playout, playouts),
+    }
+
+
+# Rollout policies compared by the suite, by name: (policy, depth cutoff)
+# 'random' is also the simulation the search uses without a policy
+SUITE_POLICIES = {'random': ('random', None), 'heavy': ('heavy', None), 'heavy_cutoff_20': ('heavy', 20)}
+
+
+# Playouts per second, average length in plies and average value of the rollouts of each policy from a position
+def benchmark_rollout_policies(game, policies=SUITE_POLICIES, playouts=200, seed=0):
+    results = {}
+    for name, (policy_name, max_plies) in policies.items():
+        policy = make_policy(policy_name, max_plies)
+        rng = random.Random(seed)
+        undo_stack = []
+        plies = 0
+        total = 0.0
+        start = time.perf_counter()
+        for _ in range(playouts):
+            total += rollout(game, undo_stack, policy, rng)
+            plies += len(undo_stack)
+            while undo_stack:
+                game.undo_move(undo_stack.pop())
+        results[name] = {'playouts_per_second': playouts / (time.perf_counter() - start),
+                         'average_length': plies / playouts, 'average_value': total / playouts}
+    return results
+
+
+# Time and memory of MCTS searches of each number of iterations from a position
+# The time is measured first, then the same search is run again under tracemalloc for its peak memory,
+# since tracing slows the search down
+def benchmark_search(game, iteration_counts=SUITE_ITERATIONS, seed=0):
+    results = []
+    for iterations in iteration_counts:
+        start = time.perf_counter()
+        tree, stats = search(game, iterations, rng=random.Random(seed))
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        search(game, iterations, rng=random.Random(seed))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({'iterations': iterations, 'iterations_run': stats['iterations'], 'seconds': seconds,
+                        'peak_memory_bytes': peak, 'tree_size': stats['tree_size'],
+                        'reserved_slots': stats['reserved_slots'], 'tree_memory_bytes': tree.memory_bytes()})
+    return results
+
+
+# Commit of the working tree, None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Run the whole suite for every engine and return the results as a dict
+# Searches are run from the placement position only, the longest part of the game
+def benchmark_suite(engines=ENGINES, iteration_counts=SUITE_ITERATIONS, seed=0):
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': seed,
+        'engines': {},
+    }
+    for name, engine in engines.items():
+        positions = suite_positions(engine)
+        results['engines'][name] = {
+            'positions': {position: benchmark_engine_position(game, seed=seed) for position, game in positions.items()},
+            'rollout_policies': {position: benchmark_rollout_policies(game, seed=seed)
+                                 for position, game in positions.items()},
+            'search': benchmark_search(positions['placement'], iteration_counts, seed),
+        }
+    return results
+
+
+# Write suite results to a JSON file
+def write_results(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+# Every number of a result dict with the path of keys leading to it, like 'engines/numpy/search/0/seconds'
+def flatten(results, prefix=''):
+    if isinstance(results, dict):
+        items = results.items()
+    elif isinstance(results, list):
+        items = enumerate(results)
+    else:
+        return {prefix: results} if isinstance(results, (int, float)) and not isinstance(results, bool) else {}
+    flat = {}
+    for key, value in items:
+        flat.update(flatten(value, f"{prefix}/{key}" if prefix else str(key)))
+    return flat
+
+
+# Print every number of two suite results side by side with their ratio new / old
+def compare_results(old, new):
+    old, new = flatten(old), flatten(new)
+    print(f"{'metric':<70} {'old':>12} {'new':>12} {'new/old':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        if key == 'seed':
+            continue
+        ratio = new[key] / old[key] if old[key] else float('nan')
+        print(f"{key:<70} {old[key]:>12.6g} {new[key]:>12.6g} {ratio:>8.2f}")
+
+
+# Playouts per second of parallel_mcts for each number of workers
+# Every worker runs iterations playouts, so the total is iterations * workers
+# The worker processes are started before timing, so only the search itself is measured
+def benchmark_parallel_scaling(worker_counts, iterations=2000, engine=BitboardBaghchal):
+    game = benchmark_position(engine)
+    results = []
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # warm up the workers
+            list(pool.map(abs, range(workers)))
+            start = time.perf_counter()
+            parallel_mcts(game, iterations, workers, seed=0, executor=pool)
+            elapsed = time.perf_counter() - start
+        playouts = iterations * workers
+        results.append({'workers': workers, 'playouts': playouts, 'seconds': elapsed,
+                        'playouts_per_second': playouts / elapsed})
+    return results
+
+
+# Playouts per second of tree_parallel_search for each number of workers
+# iterations is the total for the shared tree, simulations run in a process pool of the same size
+def benchmark_tree_parallel_scaling(worker_counts, iterations=2000, engine=BitboardBaghchal):
+    game = benchmark_position(engine)
+    results = []
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(abs, range(workers)))
+            start = time.perf_counter()
+            tree_parallel_search(game, iterations, workers, seed=0, executor=pool)
+            elapsed = time.perf_counter() - start
+        results.append({'workers': workers, 'playouts': iterations, 'seconds': elapsed,
+                        'playouts_per_second': iterations / elapsed})
+    return results
+
+
+# Playouts per second of the simulation in MCTS and of batch_rollout with each batch size
+def benchmark_batch_rollout(batch_sizes=(64, 256, 1024, 4096), playouts=2000, engine=BitboardBaghchal):
+    game = benchmark_position(engine)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(playouts):
+        simulate(game.clone(), [], rng)
+    results = [{'batch_size': 1, 'playouts_per_second': playouts / (time.perf_counter() - start)}]
+
+    batch_rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        batches = max(1, playouts // batch_size)
+        start = time.perf_counter()
+        for _ in range(batches):
+            batch_rollout(game, batch_size, batch_rng)
+        results.append({'batch_size': batch_size,
+                        'playouts_per_second': batches * batch_size / (time.perf_counter() - start)})
+    return results
+
+
+# Print a table of playouts per second and speedup over the first row
+def print_scaling(title, results):
+    print(title)
+    print("workers  playouts/s  speedup")
+    for result in results:
+        speedup = result['playouts_per_second'] / results[0]['playouts_per_second']
+        print(f"{result['workers']:>7}  {result['playouts_per_second']:>10.0f}  {speedup:>7.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        # python Benchmark.py suite [output file] [iterations...]
+        path = sys.argv[2] if len(sys.argv) > 2 else 'benchmark.json'
+        iteration_counts = tuple(int(n) for n in sys.argv[3:]) or SUITE_ITERATIONS
+        write_results(benchmark_suite(iteration_counts=iteration_counts), path)
+        print(f"Results written to {path}")
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        # python Benchmark.py compare old.json new.json
+        with open(sys.argv[2]) as old, open(sys.argv[3]) as new:
+            compare_results(json.load(old), json.load(new))
+        sys.exit()
+
+    # python Benchmark.py [iterations per worker] [max workers]
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    worker_counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= max_workers] or [1]
+    print_scaling("Root parallel", benchmark_parallel_scaling(worker_counts, iterations))
+    print_scaling("Tree parallel", benchmark_tree_parallel_scaling(worker_counts, iterations))
+    print("position      policy           playouts/s  length   value")
+    for position, game in suite_positions(BitboardBaghchal).items():
+        for name, result in benchmark_rollout_policies(game).items():
+            print(f"{position:<13} {name:<16} {result['playouts_per_second']:>10.0f} {result['average_length']:>7.1f} "
+                  f"{result['average_value']:>7.2f}")
+    print("batch size  playouts/s")
+    for result in benchmark_batch_rollout():
+        print(f"{result['batch_size']:>10}  {result['playouts_per_second']:>10.0f}")
@@ -0,0 +1,288 @@
+import numpy as np
+from collections import Counter
+import random
+import sys
+
+from Baghchal import Baghchal
+from Zobrist import ZOBRIST_GOAT, ZOBRIST_TIGER
+from BoardTables import POINTS, STEPS, JUMPS, NEIGHBOURS
+
+# Bitboard version of the Baghchal game
+# The board is stored as two 25 bit integers, one for goats and one for tigers
+# Bit i is the point (x, y) with i = x * 5 + y
+# It has the same API as the Baghchal class so it can be used by MCTS and HumanTurn.py
+
+
+# Bitboard versions of the tables in BoardTables .........................................
+FULL_BOARD = (1 << 25) - 1
+
+# STEP_MOVES[i] is a list of (destination bit, move) for every neighbour of point i
+# JUMP_MOVES[i] is a list of (jumped over bit, landing bit, move) for every jump from point i
+STEP_MOVES = [[(1 << neighbour, move) for neighbour, move in STEPS[i]] for i in range(25)]
+JUMP_MOVES = [[(1 << over, 1 << land, move) for over, land, move in JUMPS[i]] for i in range(25)]
+# ADJACENT_MASK[i] has a bit set for every neighbour of point i
+ADJACENT_MASK = [sum(1 << neighbour for neighbour in NEIGHBOURS[i]) for i in range(25)]
+
+
+# Iterate over the index of every set bit of a mask, lowest bit first
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Class to represent the Baghchal game with bitboards
+class BitboardBaghchal:
+    def __init__(self):
+        # Goats and tigers as bitboards
+        self.goat_bits = 0
+        # Initialize the tigers at the corners
+        self.tiger_bits = (1 << 0) | (1 << 4) | (1 << 20) | (1 << 24)
+
+        self.goats = 20
+        self.goats_on_board = 0
+        self.current_player = 'goat'
+        self.captured_goats = 0
+
+        # Zobrist hash of the board, the same value Baghchal computes
+        self.zobrist_key = ZOBRIST_TIGER[0] ^ ZOBRIST_TIGER[4] ^ ZOBRIST_TIGER[20] ^ ZOBRIST_TIGER[24]
+
+        # Track board states to check for draw conditions
+        # The key is the Zobrist hash of the board
+        self.state_history = Counter()
+        # Track moves without progress
+        self.moves_since_progress = 0
+
+        # Tiger moves and terminal status of the current position, see Baghchal.update_status
+        self.terminal_reason = None
+        self.winner = None
+        self.tiger_moves = self.get_moves_for_tigers()
+        self.update_status()
+
+
+    # Board as a 5x5 array, used to display the game
+    @property
+    def board(self):
+        board = np.full((5, 5), '.', dtype=object)
+        for i in iter_bits(self.goat_bits):
+            board[POINTS[i]] = 'G'
+        for i in iter_bits(self.tiger_bits):
+            board[POINTS[i]] = 'T'
+        return board
+
+    # Tiger positions as a list of (x, y) like Baghchal.tigers
+    @property
+    def tigers(self):
+        return [POINTS[i] for i in iter_bits(self.tiger_bits)]
+
+
+    # Function to print the board
+    def print_board(self):
+        print("\n".join([" ".join(row) for row in self.board]))
+
+
+    # Function to check if the tigers are blocked
+    # The tiger moves are generated once per move by apply_move and kept in tiger_moves
+    def are_tigers_blocked(self):
+        return not self.tiger_moves
+
+    # Points (x * 5 + y) of the goats and of the tigers, like Baghchal.piece_points
+    def piece_points(self):
+        return list(iter_bits(self.goat_bits)), list(iter_bits(self.tiger_bits))
+
+    # Function to clone the current state
+    # Bitboards are integers, so only the history needs to be copied
+    def clone(self):
+        new_clone = BitboardBaghchal.__new__(BitboardBaghchal)
+        new_clone.goat_bits = self.goat_bits
+        new_clone.tiger_bits = self.tiger_bits
+        new_clone.goats = self.goats
+        new_clone.goats_on_board = self.goats_on_board
+        new_clone.current_player = self.current_player
+        new_clone.captured_goats = self.captured_goats
+        new_clone.zobrist_key = self.zobrist_key
+        new_clone.state_history = self.state_history.copy()
+        new_clone.moves_since_progress = self.moves_since_progress
+        new_clone.tiger_moves = self.tiger_moves
+        new_clone.terminal_reason = self.terminal_reason
+        new_clone.winner = self.winner
+        return new_clone
+
+
+    # Compact form of the state, the same format as Baghchal.to_compact
+    def to_compact(self):
+        board = "".join('G' if self.goat_bits >> i & 1 else 'T' if self.tiger_bits >> i & 1 else '.' for i in range(25))
+        return (board, self.current_player, self.goats, self.goats_on_board,
+                self.captured_goats, self.moves_since_progress, tuple(self.state_history.items()))
+
+    # Build a state from the compact form returned by to_compact
+    @classmethod
+    def from_compact(cls, compact):
+        board, current_player, goats, goats_on_board, captured_goats, moves_since_progress, history = compact
+        state = cls()
+        state.goat_bits = sum(1 << i for i, cell in enumerate(board) if cell == 'G')
+        state.tiger_bits = sum(1 << i for i, cell in enumerate(board) if cell == 'T')
+        state.zobrist_key = 0
+        for i in iter_bits(state.goat_bits):
+            state.zobrist_key ^= ZOBRIST_GOAT[i]
+        for i in iter_bits(state.tiger_bits):
+            state.zobrist_key ^= ZOBRIST_TIGER[i]
+        state.current_player = current_player
+        state.goats = goats
+        state.goats_on_board = goats_on_board
+        state.captured_goats = captured_goats
+        state.moves_since_progress = moves_since_progress
+        state.state_history = Counter(dict(history))
+        state.tiger_moves = state.get_moves_for_tigers()
+        state.update_status()
+        return state
+
+
+    # Get valid moves for the current player
+    # Same move format as Baghchal, (x, y) for placing and ((x, y), (x, y)) for moving
+    def get_possible_moves(self):
+        if self.current_player == 'goat':
+            if self.goats > 0:
+                empty = FULL_BOARD & ~(self.goat_bits | self.tiger_bits)
+                return [POINTS[i] for i in iter_bits(empty)]
+            return self.get_moves_for_goats()
+        # Generated by the last move, the list must not be changed by the caller
+        return self.tiger_moves
+
+
+    # Get moves for goats if they all are on the board
+    def get_moves_for_goats(self):
+        empty = FULL_BOARD & ~(self.goat_bits | self.tiger_bits)
+        return [move for i in iter_bits(self.goat_bits) for dest, move in STEP_MOVES[i] if empty & dest]
+
+
+    # Get moves for tigers, adjacent empty cells or jumps over goats
+    def get_moves_for_tigers(self):
+        goat_bits = self.goat_bits
+        empty = FULL_BOARD & ~(goat_bits | self.tiger_bits)
+        moves = []
+        for i in iter_bits(self.tiger_bits):
+            for dest, move in STEP_MOVES[i]:
+                if empty & dest:
+                    moves.append(move)
+            for over, land, move in JUMP_MOVES[i]:
+                if goat_bits & over and empty & land:
+                    moves.append(move)
+        return moves
+
+
+    # Apply a move to the board
+    # The move can be placing a goat or moving a goat or moving a tiger
+    # Returns an undo record that undo_move uses to take the move back
+    def apply_move(self, move):
+        undo = (self.current_player, self.goat_bits, self.tiger_bits, self.goats, self.goats_on_board,
+                self.captured_goats, self.moves_since_progress, self.zobrist_key,
+                self.tiger_moves, self.terminal_reason, self.winner)
+
+        if self.current_player == 'goat':
+            # Place a goat on an empty cell
+            if self.goats > 0:
+                x, y = move
+                self.goat_bits |= 1 << (x * 5 + y)
+                self.zobrist_key ^= ZOBRIST_GOAT[x * 5 + y]
+                self.goats -= 1
+                self.goats_on_board += 1
+            # Move a goat to an adjacent empty cell
+            else:
+                (src_x, src_y), (dest_x, dest_y) = move
+                src, dest = src_x * 5 + src_y, dest_x * 5 + dest_y
+                self.goat_bits ^= (1 << src) | (1 << dest)
+                self.zobrist_key ^= ZOBRIST_GOAT[src] ^ ZOBRIST_GOAT[dest]
+        else:
+            (src_x, src_y), (dest_x, dest_y) = move
+            src, dest = src_x * 5 + src_y, dest_x * 5 + dest_y
+            self.tiger_bits ^= (1 << src) | (1 << dest)
+            self.zobrist_key ^= ZOBRIST_TIGER[src] ^ ZOBRIST_TIGER[dest]
+            # check if tiger is jumping over goat
+            if abs(src_x - dest_x) == 2 or abs(src_y - dest_y) == 2:
+                mid = (src_x + dest_x) // 2 * 5 + (src_y + dest_y) // 2
+                self.goat_bits &= ~(1 << mid)
+                self.zobrist_key ^= ZOBRIST_GOAT[mid]
+                self.captured_goats += 1
+                self.goats_on_board -= 1
+
+        # Track board state after the move
+        self.state_history[self.zobrist_key] += 1
+
+        # Generate the tiger moves once, for the progress rule, the terminal check and the next tiger turn
+        self.tiger_moves = self.get_moves_for_tigers()
+
+        # Reset progress counter if there's significant progress
+        if self.current_player == 'tiger' and self.captured_goats > 0:
+            self.moves_since_progress = 0
+        elif not self.tiger_moves:
+            self.moves_since_progress = 0
+        else:
+            self.moves_since_progress += 1
+
+        # Switch player
+        self.current_player = 'goat' if self.current_player == 'tiger' else 'tiger'
+        self.update_status()
+        return undo
+
+
+    # Take back a move using the record returned by apply_move
+    # Moves must be undone in the reverse order they were applied
+    def undo_move(self, undo):
+        self.state_history[self.zobrist_key] -= 1
+        if not self.state_history[self.zobrist_key]:
+            del self.state_history[self.zobrist_key]
+        (self.current_player, self.goat_bits, self.tiger_bits, self.goats, self.goats_on_board,
+         self.captured_goats, self.moves_since_progress, self.zobrist_key,
+         self.tiger_moves, self.terminal_reason, self.winner) = undo
+
+
+    # Draw and terminal checks are the same as in Baghchal
+    check_repetition_draw = Baghchal.check_repetition_draw
+    check_no_progress_draw = Baghchal.check_no_progress_draw
+    update_status = Baghchal.update_status
+    is_terminal = Baghchal.is_terminal
+
+
+# Play random games with both classes side by side and check that they agree
+# on the possible moves and terminal state after every move
+def compare_with_baghchal(games=200, seed=0):
+    rng = random.Random(seed)
+    for _ in range(games):
+        reference = Baghchal()
+        bitboard = BitboardBaghchal()
+        while True:
+            assert reference.is_terminal() == bitboard.is_terminal()
+            assert reference.terminal_reason == bitboard.terminal_reason
+            moves = reference.get_possible_moves()
+            assert sorted(moves) == sorted(bitboard.get_possible_moves())
+            assert sorted(reference.tigers) == bitboard.tigers
+            assert [sorted(points) for points in reference.piece_points()] == list(bitboard.piece_points())
+            if reference.is_terminal()[0] or not moves:
+                break
+            move = rng.choice(moves)
+            reference.apply_move(move)
+            bitboard.apply_move(move)
+            assert (reference.board == bitboard.board).all()
+            assert reference.zobrist_key == bitboard.zobrist_key
+            assert reference.goat_cells == set(iter_bits(bitboard.goat_bits))
+            assert reference.empty_cells == set(iter_bits(FULL_BOARD & ~(bitboard.goat_bits | bitboard.tiger_bits)))
+            assert reference.to_compact() == bitboard.to_compact()
+            assert Baghchal.from_compact(bitboard.to_compact()).to_compact() == BitboardBaghchal.from_compact(reference.to_compact()).to_compact()
+            # applying and undoing a move must give back the same state
+            before = (reference.board.copy(), reference.tigers, reference.zobrist_key, reference.state_history.copy())
+            moves = reference.get_possible_moves()
+            if moves and not reference.is_terminal()[0]:
+                move = rng.choice(moves)
+                reference.undo_move(reference.apply_move(move))
+                bitboard.undo_move(bitboard.apply_move(move))
+                assert (before[0] == reference.board).all() and before[1:] == (reference.tigers, reference.zobrist_key, reference.state_history)
+                assert (reference.board == bitboard.board).all() and reference.state_history == bitboard.state_history
+                assert reference.terminal_reason == bitboard.terminal_reason and reference.is_terminal() == bitboard.is_terminal()
+    return games
+
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{compare_with_baghchal(games)} random games matched")
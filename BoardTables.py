@@ -0,0 +1,39 @@
+# Precomputed tables for the 5x5 Baghchal lattice
+# Built once at import and shared by every move generator (Baghchal, BitboardBaghchal, BatchRollout)
+# Point i is the cell (x, y) with i = x * 5 + y
+# Points with (x + y) even have 8 directions, points with (x + y) odd only have 4, no diagonal
+# The direction order is the one Baghchal.get_adjacent_moves always used, so move lists keep their order
+STRAIGHT_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+ALL_DIRECTIONS = STRAIGHT_DIRECTIONS + [(-1, -1), (1, 1), (-1, 1), (1, -1)]
+
+# POINTS[i] is the (x, y) coordinate of point i, also used as the placement move
+POINTS = [(x, y) for x in range(5) for y in range(5)]
+
+# DIRECTIONS_FROM[i] has one entry per direction from point i that stays on the board:
+# (neighbour, step move, landing point of a jump or -1, jump move or None)
+# STEPS[i] is the list of (neighbour, step move) of point i
+# JUMPS[i] is the list of (jumped over point, landing point, jump move) of point i
+# NEIGHBOURS[i] is the set of neighbours of point i
+# The move tuples are built once here so move generation does not create new tuples
+DIRECTIONS_FROM = []
+STEPS = []
+JUMPS = []
+NEIGHBOURS = []
+
+for x, y in POINTS:
+    directions = STRAIGHT_DIRECTIONS if (x + y) % 2 != 0 else ALL_DIRECTIONS
+    entries = []
+    for dx, dy in directions:
+        nx, ny = x + dx, y + dy
+        if not (0 <= nx < 5 and 0 <= ny < 5):
+            continue
+        jump_x, jump_y = x + 2 * dx, y + 2 * dy
+        if 0 <= jump_x < 5 and 0 <= jump_y < 5:
+            land, jump_move = jump_x * 5 + jump_y, ((x, y), (jump_x, jump_y))
+        else:
+            land, jump_move = -1, None
+        entries.append((nx * 5 + ny, ((x, y), (nx, ny)), land, jump_move))
+    DIRECTIONS_FROM.append(entries)
+    STEPS.append([(neighbour, step_move) for neighbour, step_move, _, _ in entries])
+    JUMPS.append([(neighbour, land, jump_move) for neighbour, _, land, jump_move in entries if land != -1])
+    NEIGHBOURS.append({neighbour for neighbour, _, _, _ in entries})
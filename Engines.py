@@ -0,0 +1,6 @@
+from Baghchal import Baghchal
+from BitboardBaghchal import BitboardBaghchal
+
+# Game engines by name, both have the same API
+# Used by HumanTurn.py, the benchmarks, the self play runner, the move server and the profiler
+ENGINES = {'numpy': Baghchal, 'bitboard': BitboardBaghchal}
@@ -1,9 +1,32 @@
 from DashboardLayout import *
 from MCTS import *
 from Baghchal import *
+from Engines import ENGINES
+from OpeningBook import load_book
+import sys
 
+# The engine (see Engines.py) is chosen with the first command line argument,
+# numpy is the default
+game = ENGINES[sys.argv[1] if len(sys.argv) > 1 else 'numpy']()
 
-game = Baghchal()
+# Time the AI may think about one move, in seconds
+AI_MOVE_SECONDS = 2.0
+
+# How the game ended, for each terminal_reason of the game
+RESULT_MESSAGES = {
+    'captured': 'Tigers win, five goats were captured!',
+    'tigers_blocked': 'Goats win, the tigers are blocked!',
+    'repetition': 'Draw due to repetitive moves!',
+    'no_progress': 'Draw, no progress in 50 moves!',
+}
+
+# The AI keeps its search tree between moves
+# Every move played is passed to the searcher with advance
+searcher = MCTSSearcher()
+
+# Opening book built with OpeningBook.py, None if there is no book file
+# Book positions are answered at once, without searching
+book = load_book()
 
 # Function to take human turn
 def human_turn():
@@ -38,6 +61,7 @@ def human_turn():
                     print("Invalid input, enter again")  
             # Apply the move to the game state
             game.apply_move(moves[move_index])
+            searcher.advance(moves[move_index])
 
         # If it is the goat's turn and all goats are already placed on the board
         elif game.current_player == 'goat':
@@ -88,12 +112,21 @@ def human_turn():
                     print("Invalid input. Enter a number.")
             # Apply the move to the game state
             game.apply_move(valid_moves[move_index])
+            searcher.advance(valid_moves[move_index])
 
   
         else:
             #  AI Turn
-           move_from_ai = MCTS(game, 1000)
-           game.apply_move(move_from_ai)    
+           move_from_ai = book.lookup(game) if book is not None else None
+           if move_from_ai is None:
+               move_from_ai, stats = searcher.search(game, time_limit=AI_MOVE_SECONDS)
+           game.apply_move(move_from_ai)
+           searcher.advance(move_from_ai)    
+
+    # Show how the game ended
+    if game.is_terminal()[0]:
+        game.print_board()
+        print(RESULT_MESSAGES[game.terminal_reason])
 
 
 if __name__ == "__main__":
@@ -1,6 +1,12 @@
-from Node import *
+from Tree import Tree, decode_move
+from Zobrist import position_hash
+from Symmetry import SYMMETRIES, INVERSE, COMPOSE, CODE_IMAGES, canonical_key, transform_move, unique_moves
 from DashboardLayout import *
+from BatchRollout import batch_rollout
+from RolloutPolicy import RandomPolicy
+import numpy as np
 import random
+import time
 
 # MCTS function
 # Steps of MCTS
@@ -8,128 +14,364 @@ import random
 # 2. Expansion: Expand the node by adding a child
 # 3. Simulation: Simulate the game from the child node
 # 4. Backpropagation: Update the win and visit count of the nodes in the path
-# The MCTS function takes the game and the number of iterations as input
+# The MCTS function takes the game and the number of iterations or a time limit in seconds as input
+# The game can be a Baghchal or a BitboardBaghchal, only their shared API is used
+# The tree is stored in a Tree with room for capacity nodes
+# By default there is room for every iteration to reserve the largest possible number of children
 
+# Most moves a position can have, one per pair of neighbouring points
+MAX_CHILDREN = 56
+# Largest number of nodes of the tree when no capacity is given
+DEFAULT_CAPACITY = 1 << 20
+# The clock is only read once every this many iterations
+CLOCK_CHECK_INTERVAL = 16
+# Weight of the exploration term of UCB1 used in the selection
+EXPLORATION_WEIGHT = 1.41
 
-def MCTS(game, iteration):
-    # Initialize the root node with the current state of the game
-    # The starting game state is the root node
-    root = Node(game)
+
+# Selection and expansion
+# Walk down the tree from the root, applying the moves to the state, and expand one new node
+# Returns the path of nodes from the root, the simulation starts from the last one
+# With a transposition table, a new child for a position that is already in the table
+# shares the node of that position instead of starting with empty statistics
+# profiler is an optional SearchProfiler, the time until the end of the selection is added to it
+# With symmetry, moves to symmetric positions are expanded once and the table is keyed by canonical_key,
+# so symmetric positions share a node too (see Symmetry.py)
+# frame is the symmetry from the position the current node was created for to the game,
+# the moves kept in the tree are mapped through it before they are applied
+def select_and_expand(tree, state, undo_stack, rng=random, table=None, profiler=None,
+                      exploration_weight=EXPLORATION_WEIGHT, symmetry=False):
+    node = 0
+    path = [0]
+    frame = 0
+
+    # Selection .........................................
+    # Select the best child of the node
+    # If the node is fully expanded and has children, then select the best child otherwise expand the node
+    # I have already explained the is_fully_expanded function in the Tree class
+    while(tree.child_count[node] > 0 and tree.is_fully_expanded(node)):
+        slot = tree.get_best_child(node, exploration_weight)
+        code = tree.move[slot]
+        if frame:
+            code = CODE_IMAGES[frame][code]
+        undo_stack.append(state.apply_move(decode_move(code)))
+        if tree.symmetry[slot]:
+            frame = COMPOSE[frame][tree.symmetry[slot]]
+        node = tree.target[slot]
+        # Shared nodes can lead back to a node already on the path, the simulation then starts here
+        if table is not None and node in path:
+            if profiler is not None:
+                profiler.lap('selection')
+            return path
+        path.append(node)
+    if profiler is not None:
+        profiler.lap('selection')
+
+
+    # Expansion .........................................
+    # Expand the node by adding a child
+    # If the node is not fully expanded, then expand the node
+    # The possible moves are generated only the first time the node is reached,
+    # they are shuffled and kept in the tree, so expanding just takes the next untried one
+    # If the tree is full the node is not expanded and the simulation starts from it
+    # A position where the game is over gets no children, it stays a leaf and is scored by its result
+    if tree.move_count[node] == -1:
+        moves = state.get_possible_moves() if not state.is_terminal()[0] else []
+        if symmetry:
+            moves = unique_moves(state, moves)
+        if frame:
+            moves = [transform_move(INVERSE[frame], move) for move in moves]
+        tree.reserve_children(node, moves, rng)
+    if tree.child_count[node] < tree.move_count[node]:
+
+        # Add a child node for the next untried move and continue from it
+        node = tree.expand(node)
+
+        # Apply the move to the game state
+        code = tree.move[node]
+        if frame:
+            code = CODE_IMAGES[frame][code]
+        undo_stack.append(state.apply_move(decode_move(code)))
+
+        # Share the node of the same position if it was already reached by other moves
+        # The table keeps node * SYMMETRIES + the symmetry from the position of the node to the canonical image
+        if table is not None:
+            key, canonical = canonical_key(state) if symmetry else (position_hash(state), 0)
+            shared = table.lookup(key)
+            if shared == -1:
+                table.store(key, node * SYMMETRIES + COMPOSE[canonical][frame])
+            else:
+                shared, shared_canonical = divmod(shared, SYMMETRIES)
+                if shared not in path:
+                    # symmetry from the shared node position to the game, then to the position of the slot
+                    to_game = COMPOSE[INVERSE[canonical]][shared_canonical]
+                    tree.share(node, shared, COMPOSE[INVERSE[frame]][to_game])
+                    node = shared
+        path.append(node)
+    return path
+
+
+# Simulation
+# The game is played randomly from the current state until it is over (either win or draw),
+# with the moves of RandomPolicy (see RolloutPolicy.py)
+# Returns the winner, None for a draw
+def simulate(state, undo_stack, rng=random):
+    rollout(state, undo_stack, RandomPolicy(), rng)
+    return state.is_terminal()[1]
+
+
+# Simulation with a rollout policy (see RolloutPolicy.py)
+# The moves are picked by the policy, and if the policy has max_plies the rollout stops after that many plies
+# Returns the value of the rollout like game_result, from the winner or from the evaluation of the policy
+def rollout(state, undo_stack, policy, rng=random):
+    plies = 0
+    while not state.is_terminal()[0]:
+        if policy.max_plies is not None and plies >= policy.max_plies:
+            return policy.evaluate(state)
+        available_moves = state.get_possible_moves()
+        if not available_moves:
+            break
+        undo_stack.append(state.apply_move(policy.choose_move(state, available_moves, rng)))
+        plies += 1
+    return game_result(state.is_terminal()[1])
+
+
+# Value of a finished game from the side of the tigers
+# 1 for a tiger win, -1 for a goat win and 0 for a draw, so the value for the goats is the opposite
+def game_result(player):
+    if player == 'tiger':
+        return 1
+    elif player == 'goat':
+        return -1
+    return 0
+
+
+# Value from the side of the tigers turned to the side of the player who moved into the root of the search
+# That player is the one not to move in the game, the tigers when the goats are to play
+def root_value(game, result):
+    return result if game.current_player == 'goat' else -result
+
+
+# A search needs a number of iterations or a time limit, without either it would never stop
+def check_budget(iteration, time_limit):
+    if iteration is None and time_limit is None:
+        raise ValueError("iteration or time_limit must be given")
+
+
+# Run the MCTS iterations on the game and return the search tree and search statistics
+# The search stops after iteration iterations or after time_limit seconds, whichever comes first
+# At least one of the two must be given, ValueError is raised otherwise
+# It also stops early when the most visited move of the root cannot be overtaken in the iterations left
+# rng is the random number generator used by the search, the random module by default
+# With playouts > 1 every expanded node is simulated playouts times at once with batch_rollout
+# table is an optional TranspositionTable, positions reached by different move orders then share one node
+# The table is cleared for the new tree, its lookup and hit counts keep adding up over the searches
+# profiler is an optional SearchProfiler (see Profiler.py) that records where the time of the search goes
+# exploration_weight is the weight of the exploration term of UCB1
+# With symmetry, symmetric moves and positions share their statistics, see select_and_expand
+# policy is an optional rollout policy for the simulations, the plain random simulation (RandomPolicy) without one
+def search(game, iteration=None, capacity=None, rng=random, time_limit=None, playouts=1, table=None, profiler=None,
+           exploration_weight=EXPLORATION_WEIGHT, symmetry=False, policy=None):
+    check_budget(iteration, time_limit)
+    # Initialize the tree, node 0 is the root and stands for the current state of the game
+    if capacity is None:
+        capacity = min(1 + iteration * MAX_CHILDREN, DEFAULT_CAPACITY) if iteration is not None else DEFAULT_CAPACITY
+    tree = Tree(capacity)
+    # The entries of the table are nodes of one tree, the ones left by an earlier search point into its tree
+    if table is not None:
+        table.clear()
+    return tree, run_iterations(tree, game, iteration, rng, time_limit, playouts, table, profiler, exploration_weight,
+                                symmetry, policy)
+
+
+# Run MCTS iterations on a tree whose root is the current state of the game
+# The tree may already have statistics from an earlier search, they are kept and added to
+# Returns the search statistics, with the profile of the search under 'profile' when a profiler is given
+def run_iterations(tree, game, iteration=None, rng=random, time_limit=None, playouts=1, table=None, profiler=None,
+                   exploration_weight=EXPLORATION_WEIGHT, symmetry=False, policy=None):
+    check_budget(iteration, time_limit)
+    if policy is None:
+        policy = RandomPolicy()
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    reused_visits = tree.visits[0]
+    # Batched simulations use a NumPy generator seeded from rng
+    batch_rng = np.random.default_rng(rng.getrandbits(64)) if playouts > 1 else None
+    # Batched iterations are longer, so the clock is read more often
+    check_interval = max(1, CLOCK_CHECK_INTERVAL // playouts)
+
+    # The game state is not cloned, moves are applied to the game itself
+    # and every move is taken back with undo_move at the end of the iteration
+    # undo_stack keeps the undo records in the order the moves were applied
+    state = game
+    undo_stack = []
+    if table is not None:
+        key, canonical = canonical_key(game) if symmetry else (position_hash(game), 0)
+        table.store(key, canonical)
+    # The profiled search goes through a wrapper that counts the calls made on the game
+    if profiler is not None:
+        profiler.begin(type(game).__name__)
+        state = profiler.wrap(game)
 
     # Perform MCTS iterations
     # The number of iterations is the number of times the MCTS algorithm is run
     # The more the number of iterations, the better the move
     # However, it also increases the time taken to make a move
-    for i in range(iteration):
-        
-        node = root
-        # Clone the game state, Do not change the original game state
-        # That's why we clone the game state
-        # We use Deepcopy to clone the game state
-        state = game.clone()
-
-        # Selection .........................................
-        # Select the best child of the node
-        # If the node is fully expanded and has children, then select the best child otherwise expand the node
-        # I have already explained the is_fully_expanded function in the Node class
-        while(node.is_fully_expanded and len(node.children) >0):
-            node = node.get_best_child()
-            state.apply_move(node.last_move)
-
-        
-        # Expansion .........................................
-        # Expand the node by adding a child
-        # If the node is not fully expanded, then expand the node
-        if not node.is_fully_expanded():
-
-            # Get the available moves from the current state
-            available_moves = state.get_possible_moves()
-
-            # See if children have already been there for the available moves
-            # if yes, then ignore that move otherwise add that move in unvisited_moves
-            unvisited_moves = [move for move in available_moves if not any(child.last_move == move for child in node.children)]
-
-            # Select a random move from the unvisited moves
-            move = random.choice(unvisited_moves)
-
-            # Apply the move to the game state
-            state.apply_move(move)
-
-            # Create a child node with the new state
-            child_node = Node(state, parent=node)
-
-            # Update the last move of the child node
-            child_node.last_move = move
-
-            # Add the child node to the children of the parent node
-            node.children.append(child_node)
-
-            # Update the node to the child node
-            node = child_node
-
-        # Simulation
-        # The game is simulated that is played randomly from the current state
-        # Until the game is not over (either win or draw), the game is played randomly
-        while(not state.is_terminal()[0]):
-
-            # Get the available moves from the current state
-            available_moves = state.get_possible_moves()
-
-            # If there are no available moves, then break
-            if(not available_moves): break
-
-            # If current player is goat and goats are still to be placed on the board
-            if(game.current_player == 'goat' and game.goats > 0):
-
-                # Select a random move from the available moves
-                move = random.choice(available_moves)
-
-                # Apply the move to the game state
-                state.apply_move(move)
-
-            # If current player is goat and all goats are already placed on the board
-            elif (game.current_player == 'goat'):
-                goat_moves = {}
-
-                # from the available moves, get the positions for each goat
-                for move in available_moves:
-                    src, dest = move 
-                    if src not in goat_moves:
-                        goat_moves[src] = []
-                    goat_moves[src].append(dest)
-
-                # Select a random goat from the available goats
-                selected_goat = random.choice(list(goat_moves.keys()))
-                # Get the valid moves for the selected goat
-                valid_move = random.choice(goat_moves[selected_goat])
-                # Apply the move to the game state
-                state.apply_move(valid_move)
-            else :
-                # Select a random move from the available moves for tiger
-                move = random.choice(available_moves)
-                # Apply the move to the game state
-                state.apply_move(move)
-
-
-        # It is a terminal state, check if true, false
-        # and player is the winner
-        # print("State", state.is_terminal())
-        check, player = state.is_terminal()
-        # print("Check", state.is_terminal()[0])
+    done = 0
+    stopped_early = False
+    while iteration is None or done < iteration:
+        if profiler is not None:
+            profiler.start()
+        try:
+            path = select_and_expand(tree, state, undo_stack, rng, table, profiler, exploration_weight, symmetry)
+            if profiler is not None:
+                profiler.lap('expansion')
+                depth = len(undo_stack)
+            if batch_rng is not None:
+                tiger_wins, goat_wins, draws = batch_rollout(state, playouts, batch_rng)
+                result = tiger_wins * game_result('tiger') + goat_wins * game_result('goat') + draws * game_result(None)
+            else:
+                result = rollout(state, undo_stack, policy, rng)
+            if profiler is not None:
+                profiler.lap('simulation')
+                profiler.record_iteration(depth, len(undo_stack) - depth if batch_rng is None else None)
+        finally:
+            # Take back every move of this iteration so the game is back at the root state,
+            # also when the iteration is stopped by an exception or KeyboardInterrupt
+            while undo_stack:
+                state.undo_move(undo_stack.pop())
 
         # Backpropagation
         # Update the win and visit count of the nodes in the path
-        # If the player is the winner, then update the win count (+) of the nodes in the path
-        # If the player is the loser, then update the win count (-) of the nodes in the path
-        # If the game is a draw, then update the win count (+0.5) of the nodes in the
-        while(node):
-            node.visit += 1
-            if player == 'tiger':
-                node.win += 1
-            elif player == 'goat':
-                node.win -= 1
-            else: 
-                node.win += 0.5
-            node = node.parent
-    return root.get_best_child().last_move
+        tree.backpropagate(path, root_value(game, result), playouts)
+        if profiler is not None:
+            profiler.lap('backpropagation')
+        done += 1
+
+        # Check the time limit and the early stop every few iterations
+        if done % check_interval == 0:
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                break
+            # Iterations that can still be run, from the iteration cap and the current speed
+            remaining = iteration - done if iteration is not None else float('inf')
+            if deadline is not None:
+                remaining = min(remaining, (deadline - now) * done / (now - start))
+            if visit_lead(tree) > remaining * playouts:
+                stopped_early = True
+                break
+
+    seconds = time.perf_counter() - start
+    stats = {
+        'iterations': done,
+        'playouts': done * playouts,
+        'seconds': seconds,
+        'playouts_per_second': done * playouts / seconds if seconds > 0 else 0.0,
+        'tree_size': tree.nodes,
+        'reserved_slots': tree.size,
+        'bytes_per_node': tree.bytes_per_node(),
+        'stopped_early': stopped_early,
+        'reused_visits': reused_visits,
+    }
+    if table is not None:
+        stats['transpositions'] = table.stats()
+    if profiler is not None:
+        profiler.finish(tree)
+        stats['profile'] = profiler.to_dict()
+    return stats
+
+
+# Visits of the most visited child of the root minus the visits of the second one
+def visit_lead(tree):
+    visits = sorted((tree.visits[child] for slot, child in tree.children(0)), reverse=True)
+    if len(visits) < 2:
+        return visits[0] if visits else 0
+    return visits[0] - visits[1]
+
+
+# Most visited move of the root, this is the move the search is most sure about
+def best_move(tree):
+    slot, child = max(tree.children(0), key=lambda pair: tree.visits[pair[1]])
+    return decode_move(tree.move[slot])
+
+
+# Visit and win count of every expanded move of the root, as {move: (visit, win)}
+def root_statistics(tree):
+    return {decode_move(tree.move[slot]): (tree.visits[child], tree.wins[child])
+            for slot, child in tree.children(0)}
+
+
+# Search that keeps its tree between moves
+# After a move is played, its subtree becomes the new root and the rest of the tree is dropped,
+# so the visits already spent below the move are not thrown away
+# advance must be called with every move played in the game, by the AI and by the opponent
+# If a move was never expanded, or the game is not at the expected position, the search starts from a new root
+class MCTSSearcher:
+    def __init__(self, capacity=DEFAULT_CAPACITY, rng=random, table=None, profiler=None,
+                 exploration_weight=EXPLORATION_WEIGHT, symmetry=False, policy=None):
+        self.capacity = capacity
+        self.rng = rng
+        self.table = table
+        self.profiler = profiler
+        self.exploration_weight = exploration_weight
+        self.symmetry = symmetry
+        self.policy = policy
+        self.tree = Tree(capacity)
+        # Copy of the game at the root of the tree, None when the tree is empty
+        self.root_state = None
+
+
+    # Start again from an empty tree
+    def reset(self):
+        self.tree = Tree(self.capacity)
+        self.root_state = None
+        if self.table is not None:
+            self.table.clear()
+
+
+    # Search the game from the kept tree and return the best move and the search statistics
+    def search(self, game, iteration=None, time_limit=None, playouts=1):
+        if self.root_state is None or not same_position(self.root_state, game):
+            self.reset()
+            self.root_state = game.clone()
+        stats = run_iterations(self.tree, game, iteration, self.rng, time_limit, playouts, self.table, self.profiler,
+                               self.exploration_weight, self.symmetry, self.policy)
+        return best_move(self.tree), stats
+
+
+    # Move the root down along a move that was played
+    def advance(self, move):
+        if self.root_state is None:
+            return
+        # A child that shares the node of a symmetric position keeps its moves for that position,
+        # so it cannot become the root
+        slot = self.tree.find_slot(0, move)
+        if slot == -1 or self.tree.symmetry[slot]:
+            self.reset()
+            return
+        self.tree = self.tree.extract_subtree(self.tree.target[slot])
+        self.root_state.apply_move(move)
+        # The nodes were renumbered, so the table is filled again by the next search
+        if self.table is not None:
+            self.table.clear()
+
+
+# Check if two games are at the same position with the same player to move
+def same_position(game, other):
+    return (game.zobrist_key, game.current_player, game.goats, game.captured_goats, game.moves_since_progress) == \
+           (other.zobrist_key, other.current_player, other.goats, other.captured_goats, other.moves_since_progress)
+
+
+# Search the game and return the best move for the current player
+# Use search directly to also get the search statistics
+# book is an optional OpeningBook, a position found in it gets its book move without searching
+def MCTS(game, iteration=None, capacity=None, time_limit=None, playouts=1, table=None, profiler=None,
+         exploration_weight=EXPLORATION_WEIGHT, book=None, symmetry=False, policy=None):
+    if book is not None:
+        move = book.lookup(game)
+        if move is not None:
+            return move
+    tree, stats = search(game, iteration, capacity, time_limit=time_limit, playouts=playouts, table=table,
+                         profiler=profiler, exploration_weight=exploration_weight, symmetry=symmetry, policy=policy)
+    return best_move(tree)
 
@@ -0,0 +1,290 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from Engines import ENGINES
+from MCTS import search, best_move
+from OpeningBook import load_book
+
+# Local move server
+# Clients send one JSON object per line over TCP or a Unix socket and get one JSON object per line back
+# Searches run in a pool of worker processes, so the event loop only reads, writes and waits
+#
+# A move request looks like
+#   {"id": 1, "position": {"board": "T...T...", "player": "goat", "goats": 20, "captured": 0},
+#    "time_limit": 1.0, "iterations": null, "engine": "bitboard"}
+# board has 25 characters, 'G', 'T' or '.', for the points x * 5 + y
+# player, goats (still to place) and captured are required, moves_since_progress is 0 if it is missing
+# time_limit is capped at max_time_limit and is default_time_limit if it is missing, even when iterations is given,
+# iterations is optional, from 1 to MAX_ITERATIONS, the search stops at whichever limit comes first
+# The answer is {"id": 1, "move": [x, y] or [[x, y], [x, y]], "iterations": ..., "seconds": ..., "source": ...}
+# move is the best move found for the player to move, goats or tigers
+# source is "search", "book" for an opening book move, or "shared" when the answer came from
+# an identical search that was already running for another request
+# Errors are answered as {"id": 1, "error": "..."}, a full queue as {"id": 1, "error": "busy"}
+#
+# {"command": "stats"} answers with the number of requests served, rejected and shared,
+# the searches running and waiting, and the 50th, 90th and 99th percentiles of the latency in seconds
+
+DEFAULT_PORT = 8765
+DEFAULT_TIME_LIMIT = 1.0
+MAX_TIME_LIMIT = 30.0
+MAX_ITERATIONS = 1000000
+# Number of latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+# Integer field of a request, raises ValueError if it is not an integer from low to high
+# JSON true and false are not taken as 1 and 0
+def int_field(value, name, low, high=None):
+    if isinstance(value, bool) or not isinstance(value, int) or value < low or (high is not None and value > high):
+        limits = f"from {low} to {high}" if high is not None else f"at least {low}"
+        raise ValueError(f"{name} must be an integer {limits}")
+    return value
+
+
+# Compact state (see Baghchal.to_compact) of a position sent by a client
+# Raises ValueError if the position is not valid
+def position_from_json(position):
+    if not isinstance(position, dict):
+        raise ValueError("position must be an object")
+    board = position['board']
+    if not isinstance(board, str) or len(board) != 25 or set(board) - set('GT.'):
+        raise ValueError("board must have 25 characters among 'G', 'T' and '.'")
+    if board.count('T') != 4:
+        raise ValueError("board must have 4 tigers")
+    player = position['player']
+    if player not in ('goat', 'tiger'):
+        raise ValueError("player must be 'goat' or 'tiger'")
+    goats = int_field(position['goats'], 'goats', 0, 20)
+    captured = int_field(position['captured'], 'captured', 0, 5)
+    if goats + board.count('G') + captured != 20:
+        raise ValueError("goats to place, goats on the board and captured goats must add up to 20")
+    moves_since_progress = int_field(position.get('moves_since_progress', 0), 'moves_since_progress', 0)
+    return (board, player, goats, board.count('G'), captured, moves_since_progress, ())
+
+
+# Move as JSON lists, and back to a move that apply_move takes
+def move_to_json(move):
+    return list(move) if not isinstance(move[0], tuple) else [list(move[0]), list(move[1])]
+
+def move_from_json(move):
+    return tuple(move) if not isinstance(move[0], list) else (tuple(move[0]), tuple(move[1]))
+
+
+# Search one position in a worker process, returns the move and the number of iterations and seconds
+def _search_worker(engine, compact, iterations, time_limit, seed):
+    game = ENGINES[engine].from_compact(compact)
+    tree, stats = search(game, iterations, rng=random.Random(seed), time_limit=time_limit)
+    return best_move(tree), stats['iterations'], stats['seconds']
+
+
+# Value of a sorted list at a percentile, None for an empty list
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class MoveServer:
+    # workers is the number of search processes, max_queue the number of searches that can be
+    # running or waiting at once, more requests are answered "busy" right away
+    def __init__(self, workers=None, max_queue=64, default_time_limit=DEFAULT_TIME_LIMIT,
+                 max_time_limit=MAX_TIME_LIMIT, book=None):
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.default_time_limit = default_time_limit
+        self.max_time_limit = max_time_limit
+        self.book = book
+        self.pool = None
+        # Searches running or waiting as (future, pool), by (engine, compact, iterations, time limit),
+        # every request for the same search waits on the same future
+        self.searches = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.served = 0
+        self.rejected = 0
+        self.shared = 0
+
+
+    # Start the worker processes and listen on a TCP port, or on a Unix socket if path is given
+    # Workers are started with spawn, forked workers would keep a copy of the client connections
+    # open at the time and the connections would not close when the server closes them
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+        self.start_pool()
+        # Make the workers start now, so the first requests do not wait for them
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)))
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def start_pool(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    # Stop the worker processes
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+    # Read the requests of one client, every request is answered as soon as its move is found,
+    # so requests sent one after the other on the same connection are searched at the same time
+    async def handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.answer(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    # Answer one request, nothing is sent if the client has already gone
+    async def answer(self, line, writer, write_lock):
+        response = await self.handle_request(line)
+        async with write_lock:
+            try:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+    # Answer one request line
+    async def handle_request(self, line):
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.get('id')
+            if request.get('command') == 'stats':
+                return {'id': request_id, **self.stats()}
+            response = await self.find_move(request)
+        except (ValueError, KeyError, TypeError) as error:
+            return {'id': request_id, 'error': str(error)}
+        except Exception as error:
+            # A failed search must not take the connection down with it
+            return {'id': request_id, 'error': f"search failed: {error!r}"}
+        if response is None:
+            self.rejected += 1
+            return {'id': request_id, 'error': 'busy'}
+        self.served += 1
+        self.latencies.append(time.perf_counter() - start)
+        return {'id': request_id, **response}
+
+
+    # Move for a move request, None if the queue is full
+    async def find_move(self, request):
+        engine = request.get('engine', 'bitboard')
+        if not isinstance(engine, str) or engine not in ENGINES:
+            raise ValueError(f"engine must be one of {sorted(ENGINES)}")
+        iterations = request.get('iterations')
+        time_limit = request.get('time_limit')
+        if iterations is not None:
+            iterations = int_field(iterations, 'iterations', 1, MAX_ITERATIONS)
+        if time_limit is not None:
+            if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or not time_limit > 0:
+                raise ValueError("time_limit must be a number of seconds above 0")
+        # Every search has a time limit, so no request can hold a worker longer than max_time_limit
+        time_limit = min(float(time_limit or self.default_time_limit), self.max_time_limit)
+
+        compact = position_from_json(request['position'])
+        game = ENGINES[engine].from_compact(compact)
+        if game.is_terminal()[0] or not game.get_possible_moves():
+            raise ValueError("the game is over in this position")
+
+        if self.book is not None:
+            move = self.book.lookup(game)
+            if move is not None:
+                return {'move': move_to_json(move), 'iterations': 0, 'seconds': 0.0, 'source': 'book'}
+
+        # An identical search that is already running answers this request too
+        # Searches are kept with the pool they run in
+        key = (engine, compact, iterations, time_limit)
+        source = 'shared'
+        entry = self.searches.get(key)
+        if entry is None:
+            if len(self.searches) >= self.max_queue:
+                return None
+            source = 'search'
+            entry = (asyncio.get_running_loop().run_in_executor(
+                self.pool, _search_worker, engine, compact, iterations, time_limit, random.getrandbits(32)), self.pool)
+            self.searches[key] = entry
+            entry[0].add_done_callback(lambda done: self.searches.pop(key, None))
+        else:
+            self.shared += 1
+        future, pool = entry
+        try:
+            move, done, seconds = await asyncio.shield(future)
+        except BrokenProcessPool:
+            # A worker died, the pool cannot be used any more and is started again for the next requests
+            # Every search of the broken pool fails, only the first one to get here replaces it
+            if pool is self.pool:
+                pool.shutdown(wait=False)
+                self.start_pool()
+            raise
+        return {'move': move_to_json(move), 'iterations': done, 'seconds': seconds, 'source': source}
+
+
+    # Server statistics as a dict
+    def stats(self):
+        latencies = sorted(self.latencies)
+        searches = len(self.searches)
+        return {
+            'served': self.served,
+            'rejected': self.rejected,
+            'shared': self.shared,
+            'running': min(searches, self.workers),
+            'queue_depth': max(0, searches - self.workers),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p90': percentile(latencies, 0.9),
+            'latency_p99': percentile(latencies, 0.99),
+        }
+
+
+# Send requests to a server on one connection and return the answers in the order they were sent
+async def send_requests(requests, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    for number, request in enumerate(requests):
+        writer.write(json.dumps({'id': number, **request}).encode() + b"\n")
+    await writer.drain()
+    answers = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    await writer.wait_closed()
+    return sorted(answers, key=lambda answer: answer['id'])
+
+
+async def main(port, workers):
+    server = MoveServer(workers, book=load_book())
+    listener = await server.start(port=port)
+    print(f"Serving moves on port {port} with {server.workers} workers", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    # python MoveServer.py [port] [workers]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    asyncio.run(main(port, workers))
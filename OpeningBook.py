@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import sys
+
+import numpy as np
+
+from BitboardBaghchal import BitboardBaghchal
+from MCTS import search, best_move
+from Symmetry import canonical_key, transform_move, INVERSE
+from Tree import encode_move, decode_move
+
+# Opening book for the placement phase
+# The first moves have the most possible moves, so they are where a search spends the most time for the least gain
+# The book is built offline by searching every position up to a number of plies from the start, deeply,
+# and it then answers those positions at once without searching
+#
+# Positions are stored by their canonical key (see Symmetry.py), so the 8 symmetric images of a position
+# share one record, and the book move is stored as the move in the canonical image
+# The file is two .npy arrays written one after the other: the keys, sorted, as '<u8',
+# then the moves in the same order as '<u2' (np.load on the file reads the keys)
+# Both arrays are opened memory mapped: loading only reads the headers, and a lookup is a binary search
+# on the contiguous key array that only reads the few pages of the file it touches
+
+KEY_DTYPE = np.dtype('<u8')
+MOVE_DTYPE = np.dtype('<u2')
+
+# Default file of the book, next to this file
+# Books in the older opening_book.npy were searched with every node scored from the tiger side,
+# so their goat moves are the worst ones, and opening_book_v2.npy kept (key, move) records whose
+# key column could not be searched without a copy, neither is loaded by default and must be built again
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book_v3.npy')
+
+
+# Memory map the .npy array that starts at the current position of file
+# Returns the array and the position in the file right after it
+def map_array(file, path):
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    offset = file.tell()
+    end = offset + int(np.prod(shape)) * dtype.itemsize
+    # An empty array cannot be memory mapped
+    if end == offset:
+        return np.zeros(shape, dtype=dtype), end
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape), end
+
+
+# Write a book file from its keys and moves, the keys must be sorted
+def write_book(path, keys, moves):
+    with open(path, 'wb') as file:
+        np.save(file, np.asarray(keys, dtype=KEY_DTYPE))
+        np.save(file, np.asarray(moves, dtype=MOVE_DTYPE))
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_PATH):
+        with open(path, 'rb') as file:
+            self.keys, end = map_array(file, path)
+            file.seek(end)
+            self.moves, end = map_array(file, path)
+        if self.keys.dtype != KEY_DTYPE or self.moves.dtype != MOVE_DTYPE or len(self.keys) != len(self.moves):
+            raise ValueError(f"{path} is not an opening book, build it again with build_book")
+
+
+    # Number of positions in the book
+    def __len__(self):
+        return len(self.keys)
+
+    # Book move of the game, None if the position is not in the book
+    # The state can be any engine with piece_points
+    def lookup(self, state):
+        key, t = canonical_key(state)
+        index = np.searchsorted(self.keys, np.uint64(key))
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+        # The stored move is for the canonical image, take it back to the game
+        move = transform_move(INVERSE[t], decode_move(int(self.moves[index])))
+        # A different position with the same 64 bit key would give a move that is not legal here
+        if move not in state.get_possible_moves():
+            return None
+        return move
+
+
+# Open the book at path, None if there is no book file
+def load_book(path=BOOK_PATH):
+    return OpeningBook(path) if os.path.exists(path) else None
+
+
+# Search one position in a worker process and return its book record
+# The move is the best one for the player to move, the goats on the placement plies
+def _book_worker(compact, iterations, seed):
+    game = BitboardBaghchal.from_compact(compact)
+    tree, stats = search(game, iterations, rng=random.Random(seed))
+    key, t = canonical_key(game)
+    return key, encode_move(transform_move(t, best_move(tree)))
+
+
+# Build the book for every position up to plies plies from the start and write it to path
+# Positions are searched with iterations iterations each, one position per worker process
+# Symmetric positions are searched once, so every ply is reduced to its canonical positions
+# Returns the number of positions in the book
+def build_book(path=BOOK_PATH, plies=3, iterations=20000, workers=None, seed=0):
+    rng = random.Random(seed)
+    level = {canonical_key(BitboardBaghchal())[0]: BitboardBaghchal()}
+    records = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for ply in range(plies):
+            games = list(level.values())
+            compacts = [game.to_compact() for game in games]
+            seeds = [rng.getrandbits(32) for _ in games]
+            for key, move in pool.map(_book_worker, compacts, [iterations] * len(games), seeds):
+                records[key] = move
+            print(f"ply {ply}: {len(games)} positions searched", file=sys.stderr)
+
+            # Canonical positions of the next ply
+            next_level = {}
+            for game in games:
+                for move in game.get_possible_moves():
+                    child = game.clone()
+                    child.apply_move(move)
+                    if child.is_terminal()[0]:
+                        continue
+                    key = canonical_key(child)[0]
+                    if key not in records and key not in next_level:
+                        next_level[key] = child
+            level = next_level
+
+    keys = sorted(records)
+    write_book(path, keys, [records[key] for key in keys])
+    return len(keys)
+
+
+if __name__ == "__main__":
+    # python OpeningBook.py [plies] [iterations per position] [output file] [workers]
+    plies = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    path = sys.argv[3] if len(sys.argv) > 3 else BOOK_PATH
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    print(f"{build_book(path, plies, iterations, workers)} positions written to {path}")
@@ -0,0 +1,120 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import random
+import threading
+
+from MCTS import MAX_CHILDREN, search, root_statistics, select_and_expand, simulate, game_result, root_value, \
+    best_move
+from Tree import Tree
+
+# Root parallel MCTS
+# Every worker process runs its own independent search from the same root, with its own seed
+# The visit and win counts of the root moves are then added up over all the workers
+# and the move with the most visits is chosen
+# The game is sent to the workers in its compact form (to_compact), not as a pickled game object
+
+
+# Run one search in a worker process and return the root statistics
+# engine is the game class, Baghchal or BitboardBaghchal
+def _search_worker(engine, compact, iterations, seed):
+    random.seed(seed)
+    game = engine.from_compact(compact)
+    tree, stats = search(game, iterations)
+    return root_statistics(tree)
+
+
+# Sum the {move: (visit, win)} statistics of several searches
+def merge_statistics(all_statistics):
+    merged = {}
+    for statistics in all_statistics:
+        for move, (visit, win) in statistics.items():
+            total_visit, total_win = merged.get(move, (0, 0))
+            merged[move] = (total_visit + visit, total_win + win)
+    return merged
+
+
+# Search the game with one independent search per worker and return the best move
+# iterations is the number of iterations of each worker
+# An executor can be passed to reuse the same worker processes between moves,
+# otherwise a pool of worker processes is started for this call
+def parallel_mcts(game, iterations, workers=None, seed=None, executor=None):
+    workers = workers or os.cpu_count()
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(workers)]
+    compact = game.to_compact()
+    engine = type(game)
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return parallel_mcts(game, iterations, workers, seed, pool)
+
+    futures = [executor.submit(_search_worker, engine, compact, iterations, worker_seed) for worker_seed in seeds]
+    statistics = merge_statistics(future.result() for future in futures)
+
+    # The move visited the most over all the workers
+    return max(statistics, key=lambda move: statistics[move][0])
+
+
+# Tree parallel MCTS
+# Several worker threads run selection, expansion, simulation and backpropagation on one shared tree
+# Every worker has its own copy of the game, made once at the start
+# The tree is only read and changed while holding a lock
+# While a worker simulates, the path to its node carries a virtual loss so the other workers
+# are pushed to other parts of the tree
+# Simulations run in the worker thread, or in a process pool if an executor is given
+# so they do not hold the GIL and run at the same time
+
+
+# Play one simulation in a worker process and return the winner
+def _rollout_worker(engine, compact, seed):
+    return simulate(engine.from_compact(compact), [], random.Random(seed))
+
+
+# Search the game with workers threads sharing one tree and return the tree
+# With one worker and no executor the search is deterministic for a given seed
+def tree_parallel_search(game, iterations, workers=None, seed=None, executor=None, capacity=None):
+    workers = workers or os.cpu_count()
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(workers)]
+    engine = type(game)
+    tree = Tree(capacity or 1 + iterations * MAX_CHILDREN)
+    lock = threading.Lock()
+    remaining = [iterations]
+
+    def worker(worker_seed):
+        worker_rng = random.Random(worker_seed)
+        state = game.clone()
+        undo_stack = []
+        while True:
+            # Selection and expansion on the shared tree
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+                path = select_and_expand(tree, state, undo_stack, worker_rng)
+                tree.add_virtual_loss(path)
+
+            # Simulation, without holding the lock
+            if executor is None:
+                player = simulate(state, undo_stack, worker_rng)
+                while undo_stack:
+                    state.undo_move(undo_stack.pop())
+            else:
+                compact = state.to_compact()
+                while undo_stack:
+                    state.undo_move(undo_stack.pop())
+                player = executor.submit(_rollout_worker, engine, compact, worker_rng.getrandbits(32)).result()
+
+            # Backpropagation, the virtual loss is replaced by the real result
+            with lock:
+                tree.revert_virtual_loss(path, root_value(game, game_result(player)))
+
+    with ThreadPoolExecutor(max_workers=workers) as threads:
+        for future in [threads.submit(worker, worker_seed) for worker_seed in seeds]:
+            future.result()
+    return tree
+
+
+# Search the game with a shared tree and return the best move, like MCTS
+def tree_parallel_mcts(game, iterations, workers=None, seed=None, executor=None):
+    return best_move(tree_parallel_search(game, iterations, workers, seed, executor))
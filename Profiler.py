@@ -0,0 +1,130 @@
+from collections import Counter
+import json
+import random
+import sys
+import time
+
+# Profiling of the MCTS search
+# A SearchProfiler is passed to search, run_iterations, MCTSSearcher.search or MCTS with profiler=...
+# Without one, the search only checks "profiler is not None" a few times per iteration
+#
+# For one search it records
+# - the time spent in selection, expansion, simulation and backpropagation
+#   (taking back the moves of the iteration with undo_move is counted in backpropagation)
+# - the number of clone, get_possible_moves and apply_move calls made on the game
+# - the number of rollouts and their average length in plies
+# - the deepest node the search reached, in moves from the root, the number of nodes of the tree
+#   and the number of child slots it reserved, untried moves included (see Tree.nodes and Tree.size)
+# Rollout lengths are only known for single simulations, not for batched ones (playouts > 1)
+# The counts come from a CountingState wrapped around the game, which makes the profiled search a bit slower
+
+PHASES = ('selection', 'expansion', 'simulation', 'backpropagation')
+
+
+# Game wrapper that counts the calls made on it and passes everything else to the game
+class CountingState:
+    def __init__(self, state, counts):
+        self._state = state
+        self._counts = counts
+
+    def __getattr__(self, name):
+        return getattr(self._state, name)
+
+    def clone(self):
+        self._counts['clone'] += 1
+        return self._state.clone()
+
+    def get_possible_moves(self):
+        self._counts['get_possible_moves'] += 1
+        return self._state.get_possible_moves()
+
+    def apply_move(self, move):
+        self._counts['apply_move'] += 1
+        return self._state.apply_move(move)
+
+
+class SearchProfiler:
+    def __init__(self):
+        self.begin()
+
+
+    # Start a new search, the numbers of the last search are dropped
+    def begin(self, engine=None):
+        self.engine = engine
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = Counter(clone=0, get_possible_moves=0, apply_move=0)
+        self.iterations = 0
+        self.rollouts = 0
+        self.rollout_plies = 0
+        self.max_depth = 0
+        self.node_count = 0
+        self.reserved_slots = 0
+        self.last = time.perf_counter()
+
+    # Game to search instead of the game itself, so its calls are counted
+    def wrap(self, state):
+        return CountingState(state, self.counts)
+
+
+    # Restart the phase clock, called at the start of every iteration
+    def start(self):
+        self.last = time.perf_counter()
+
+    # Add the time since the last lap to a phase
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.times[phase] += now - self.last
+        self.last = now
+
+    # Record one iteration, depth is the number of moves from the root to the simulated node
+    # rollout_plies is the length of its simulation, None when it is not known
+    def record_iteration(self, depth, rollout_plies=None):
+        self.iterations += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if rollout_plies is not None:
+            self.rollouts += 1
+            self.rollout_plies += rollout_plies
+
+    # Called at the end of the search
+    def finish(self, tree):
+        self.node_count = tree.nodes
+        self.reserved_slots = tree.size
+
+
+    # Numbers of the last search as a dict
+    def to_dict(self):
+        return {
+            'engine': self.engine,
+            'iterations': self.iterations,
+            'seconds': dict(self.times),
+            'calls': dict(self.counts),
+            'rollouts': self.rollouts,
+            'average_rollout_length': self.rollout_plies / self.rollouts if self.rollouts else 0.0,
+            'max_depth': self.max_depth,
+            'node_count': self.node_count,
+            'reserved_slots': self.reserved_slots,
+        }
+
+    # Numbers of the last search as one line of JSON
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    # Append the numbers of the last search to a JSON lines file
+    def write(self, path):
+        with open(path, 'a') as file:
+            file.write(self.to_json() + "\n")
+
+
+if __name__ == "__main__":
+    # python Profiler.py [iterations] [engine]
+    # Profile one search from the benchmark position and print it as JSON
+    from Engines import ENGINES
+    from Benchmark import benchmark_position
+    from MCTS import search
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    engine = ENGINES[sys.argv[2] if len(sys.argv) > 2 else 'bitboard']
+    profiler = SearchProfiler()
+    search(benchmark_position(engine), iterations, rng=random.Random(0), profiler=profiler)
+    print(profiler.to_json())
@@ -0,0 +1,81 @@
+from BoardTables import JUMPS
+
+# Rollout policies for the simulation step of MCTS
+# A policy picks the moves of a rollout with choose_move(state, moves, rng)
+# With max_plies, the rollout stops after that many plies and the position is scored by evaluate(state)
+# instead of being played to the end
+# evaluate gives a value on the scale of MCTS.game_result: 1 for a tiger win, -1 for a goat win
+#
+# RandomPolicy is the plain simulation of MCTS (MCTS.simulate and searches without a policy):
+# uniform placements and tiger moves, and for goat moves a random goat first and then one of its moves
+# HeavyPolicy makes the tigers capture whenever they can, and the goats avoid moves
+# after which a goat can be captured
+# MCTS uses a policy when one is passed to search, MCTS or MCTSSearcher with policy=...
+# Batched rollouts (playouts > 1) always play uniform random moves
+
+# Every jump move of a tiger, a jump always captures the goat it jumps over
+JUMP_MOVES = {move for i in range(25) for _, _, move in JUMPS[i]}
+
+
+class RandomPolicy:
+    def __init__(self, max_plies=None):
+        self.max_plies = max_plies
+
+
+    # Move to play in the rollout, moves are the possible moves of the state
+    def choose_move(self, state, moves, rng):
+        # All goats are on the board, pick a goat and then one of its moves
+        if state.current_player == 'goat' and state.goats == 0:
+            goat_moves = {}
+            for move in moves:
+                src, dest = move
+                if src not in goat_moves:
+                    goat_moves[src] = []
+                goat_moves[src].append(move)
+            return rng.choice(goat_moves[rng.choice(list(goat_moves.keys()))])
+        return rng.choice(moves)
+
+
+    # Static evaluation of a position where the rollout was cut off
+    # Captured goats are worth the most, 5 wins the game for the tigers,
+    # a goat that can be captured now counts as half a capture,
+    # and tigers with few moves left are close to being blocked, which wins the game for the goats
+    def evaluate(self, state):
+        tiger_moves = state.tiger_moves
+        threatened = any(move in JUMP_MOVES for move in tiger_moves)
+        captures = (state.captured_goats + 0.5 * threatened) / 5
+        mobility = min(len(tiger_moves), 8) / 8
+        value = 2 * (0.7 * captures + 0.3 * mobility) - 1
+        return max(-1.0, min(1.0, value))
+
+
+class HeavyPolicy(RandomPolicy):
+    # Tigers capture when they can
+    # Goats try their moves in random order and play the first one after which no goat can be captured
+    # If every move leaves a goat open, one of them is played at random
+    def choose_move(self, state, moves, rng):
+        if state.current_player == 'tiger':
+            captures = [move for move in moves if move in JUMP_MOVES]
+            return rng.choice(captures or moves)
+
+        candidates = list(moves)
+        rng.shuffle(candidates)
+        for move in candidates:
+            undo = state.apply_move(move)
+            # apply_move already generated the tiger moves of the new position
+            safe = not any(tiger_move in JUMP_MOVES for tiger_move in state.tiger_moves)
+            state.undo_move(undo)
+            if safe:
+                return move
+        return candidates[0]
+
+
+# Rollout policies by name, used by SelfPlay.py and the benchmarks
+POLICIES = {'random': RandomPolicy, 'heavy': HeavyPolicy}
+
+
+# Policy from its name and an optional depth cutoff, None for the plain simulation
+def make_policy(name=None, max_plies=None):
+    if name is None and max_plies is None:
+        return None
+    return POLICIES[name or 'random'](max_plies)
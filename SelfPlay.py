@@ -0,0 +1,204 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from Engines import ENGINES
+from MCTS import MCTSSearcher, EXPLORATION_WEIGHT, MAX_CHILDREN, DEFAULT_CAPACITY, check_budget
+from RolloutPolicy import make_policy
+from Tree import encode_move
+
+# Self play tournament between two MCTS agents, without any input from the console
+# An agent is a dict of search settings, missing settings are taken from DEFAULT_AGENT
+# The two agents swap sides every game, agent A is the tiger in even games and the goat in odd games
+# Games are played in worker processes and every finished game is written as one JSON line
+# to the output file as soon as it is done, so a long tournament can be followed or stopped at any time
+#
+# A game record has the game number, its seed, the name of the agent on each side,
+# the winner ('tiger', 'goat' or None for a draw) and the name of the winning agent,
+# how the game ended, the moves encoded with encode_move and the seconds spent on each move
+
+DEFAULT_AGENT = {
+    'name': 'mcts',
+    # Search budget of one move, iterations and/or seconds
+    'iterations': 1000,
+    'time_limit': None,
+    'exploration_weight': EXPLORATION_WEIGHT,
+    # Simulations per expanded node, more than 1 uses batch_rollout
+    'playouts': 1,
+    # Rollout policy by name ('random' or 'heavy', see RolloutPolicy.py) and depth cutoff of the rollouts,
+    # both None for the plain simulation
+    'policy': None,
+    'rollout_depth': None,
+    # Expand moves to symmetric positions once, see Symmetry.py
+    'symmetry': False,
+    # Keep the search tree between moves
+    'reuse_tree': True,
+    # Nodes of the search tree, by default room for two searches of iterations iterations
+    'capacity': None,
+}
+
+# A game that is still going after this many moves is stopped as a draw with the reason 'move_limit'
+# Games between searching agents end well before it, it only bounds games the draw rules do not end,
+# since after the first capture every tiger move resets the no progress count
+MAX_MOVES = 500
+
+
+# Agent settings with the defaults filled in
+# Raises ValueError for an agent with neither iterations nor a time limit
+def agent_config(config):
+    config = {**DEFAULT_AGENT, **config}
+    check_budget(config['iterations'], config['time_limit'])
+    if config['capacity'] is None:
+        iterations = config['iterations']
+        config['capacity'] = min(1 + 2 * iterations * MAX_CHILDREN, DEFAULT_CAPACITY) if iterations else DEFAULT_CAPACITY
+    return config
+
+
+# Play one game between two agents and return its record
+# tiger and goat are agent configs, seed makes the game reproducible
+def play_game(tiger, goat, seed, engine='bitboard', game_number=0, max_moves=MAX_MOVES):
+    rng = random.Random(seed)
+    game = ENGINES[engine]()
+    agents = {'tiger': agent_config(tiger), 'goat': agent_config(goat)}
+    searchers = {side: MCTSSearcher(agent['capacity'], random.Random(rng.getrandbits(64)),
+                                    exploration_weight=agent['exploration_weight'], symmetry=agent['symmetry'],
+                                    policy=make_policy(agent['policy'], agent['rollout_depth']))
+                 for side, agent in agents.items()}
+    moves = []
+    move_seconds = []
+
+    while not game.is_terminal()[0] and len(moves) < max_moves:
+        if not game.get_possible_moves():
+            break
+        side = game.current_player
+        agent = agents[side]
+        searcher = searchers[side]
+        if not agent['reuse_tree']:
+            searcher.reset()
+        start = time.perf_counter()
+        move, stats = searcher.search(game, agent['iterations'], agent['time_limit'], agent['playouts'])
+        move_seconds.append(round(time.perf_counter() - start, 4))
+        game.apply_move(move)
+        moves.append(encode_move(move))
+        for other in searchers.values():
+            other.advance(move)
+
+    terminal, winner = game.is_terminal()
+    if terminal:
+        reason = game.terminal_reason
+    else:
+        reason = 'no_moves' if len(moves) < max_moves else 'move_limit'
+    return {
+        'game': game_number,
+        'seed': seed,
+        'engine': engine,
+        'tiger': agents['tiger']['name'],
+        'goat': agents['goat']['name'],
+        'winner': winner,
+        'winner_agent': agents[winner]['name'] if winner else None,
+        'reason': reason,
+        'moves': moves,
+        'move_seconds': move_seconds,
+    }
+
+
+# Wilson score interval of a proportion of successes out of n, at the confidence of z standard deviations
+def wilson_interval(successes, n, z=1.96):
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+# Win, loss and draw counts of every agent over a list of game records, overall and per side
+# The rates come with their 95% Wilson interval, draws count as half a win in the score
+def summarize(records):
+    summary = {}
+    for record in records:
+        for side in ('tiger', 'goat'):
+            name = record[side]
+            totals = summary.setdefault(name, {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0,
+                                               'tiger': {'games': 0, 'wins': 0}, 'goat': {'games': 0, 'wins': 0}})
+            won = record['winner'] == side
+            totals['games'] += 1
+            totals[side]['games'] += 1
+            if won:
+                totals['wins'] += 1
+                totals[side]['wins'] += 1
+            elif record['winner'] is None:
+                totals['draws'] += 1
+            else:
+                totals['losses'] += 1
+
+    for totals in summary.values():
+        games = totals['games']
+        totals['win_rate'] = totals['wins'] / games
+        totals['win_rate_interval'] = wilson_interval(totals['wins'], games)
+        totals['score'] = (totals['wins'] + 0.5 * totals['draws']) / games
+        for side in ('tiger', 'goat'):
+            side_totals = totals[side]
+            side_totals['win_rate'] = side_totals['wins'] / side_totals['games'] if side_totals['games'] else 0.0
+            side_totals['win_rate_interval'] = wilson_interval(side_totals['wins'], side_totals['games'])
+    return summary
+
+
+# Play games between agent a and agent b in worker processes and write every record to output
+# The records are written in the order the games finish, each with its game number
+# The agents must have different names, they are told apart by name in the records
+# Returns the summary of all the games
+def run_tournament(agent_a, agent_b, games, output, workers=None, seed=0, engine='bitboard', progress=None):
+    agent_a, agent_b = agent_config(agent_a), agent_config(agent_b)
+    if agent_a['name'] == agent_b['name']:
+        raise ValueError("The two agents must have different names")
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(games)]
+    records = []
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, open(output, 'a') as file:
+        futures = []
+        for number, game_seed in enumerate(seeds):
+            tiger, goat = (agent_a, agent_b) if number % 2 == 0 else (agent_b, agent_a)
+            futures.append(pool.submit(play_game, tiger, goat, game_seed, engine, number))
+        for future in as_completed(futures):
+            record = future.result()
+            file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            file.flush()
+            records.append(record)
+            if progress is not None:
+                progress(len(records), games, record)
+    return summarize(records)
+
+
+# Progress line of a finished game on stderr
+def print_progress(done, games, record):
+    print(f"{done}/{games} game {record['game']}: {record['winner_agent'] or 'draw'} ({record['reason']})",
+          file=sys.stderr)
+
+
+# Print the summary of a tournament as a table
+def print_summary(summary):
+    print(f"{'agent':<12} {'games':>5} {'wins':>5} {'draws':>5} {'losses':>6} {'win rate (95% CI)':>24} "
+          f"{'as tiger':>8} {'as goat':>8}")
+    for name, totals in summary.items():
+        low, high = totals['win_rate_interval']
+        print(f"{name:<12} {totals['games']:>5} {totals['wins']:>5} {totals['draws']:>5} {totals['losses']:>6} "
+              f"{totals['win_rate']:>7.3f} [{low:.3f}, {high:.3f}]  "
+              f"{totals['tiger']['win_rate']:>8.3f} {totals['goat']['win_rate']:>8.3f}")
+
+
+if __name__ == "__main__":
+    # python SelfPlay.py [games] [output.jsonl] [agent A as JSON] [agent B as JSON] [workers]
+    # for example: python SelfPlay.py 100 games.jsonl '{"name": "a", "iterations": 500}' '{"name": "b", "iterations": 2000}'
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    output = sys.argv[2] if len(sys.argv) > 2 else 'selfplay.jsonl'
+    agent_a = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {'name': 'a', 'iterations': 200}
+    agent_b = json.loads(sys.argv[4]) if len(sys.argv) > 4 else {'name': 'b', 'iterations': 800}
+    workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    print_summary(run_tournament(agent_a, agent_b, games, output, workers, progress=print_progress))
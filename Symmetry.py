@@ -0,0 +1,180 @@
+from collections import Counter
+
+from BoardTables import POINTS
+from Tree import MOVES, MOVE_CODES
+from Zobrist import ZOBRIST_GOAT, ZOBRIST_TIGER, ZOBRIST_TIGER_TO_MOVE, ZOBRIST_GOATS_IN_HAND
+
+# Symmetries of the board
+# The 5x5 lattice with its diagonals looks the same after any of the 8 rotations and reflections of the square,
+# so positions that are mapped onto each other by one of them have the same value and the same best moves
+# Symmetry t swaps x and y if t & 4, then flips x if t & 1 and flips y if t & 2, t = 0 is the identity
+# Every symmetry keeps x + y even or odd, so points with diagonals are mapped to points with diagonals
+#
+# The canonical key of a position is the smallest position hash over its 8 images
+# Symmetric positions have the same canonical key, and canonical_key also returns the symmetry
+# that maps the position to the image with that key, so moves can be mapped between the two
+#
+# MCTS uses the symmetries in two ways when searching with symmetry=True:
+# - moves that lead to symmetric positions are expanded once (unique_moves)
+# - the transposition table is keyed by canonical_key, so the symmetric images of a position share one node
+#   A node's moves are stored for the position that created it, and every tree slot keeps the symmetry
+#   from the node it points to to its own position, so the search maps the moves to the game it plays
+# The repetition draw is not changed, a repeated position must be the same board, not a symmetric one
+
+SYMMETRIES = 8
+
+
+# Image of the point (x, y) under symmetry t
+def transform_point(t, point):
+    x, y = point
+    if t & 4:
+        x, y = y, x
+    if t & 1:
+        x = 4 - x
+    if t & 2:
+        y = 4 - y
+    return x, y
+
+
+# PERMUTATIONS[t][i] is the image of point i = x * 5 + y under symmetry t
+PERMUTATIONS = [[x * 5 + y for x, y in (transform_point(t, point) for point in POINTS)] for t in range(SYMMETRIES)]
+# INVERSE[t] is the symmetry that takes the images of t back to where they were
+INVERSE = [next(u for u in range(SYMMETRIES) if all(PERMUTATIONS[u][PERMUTATIONS[t][i]] == i for i in range(25)))
+           for t in range(SYMMETRIES)]
+# COMPOSE[a][b] is the symmetry b followed by a
+COMPOSE = [[next(c for c in range(SYMMETRIES)
+                 if all(PERMUTATIONS[c][i] == PERMUTATIONS[a][PERMUTATIONS[b][i]] for i in range(25)))
+            for b in range(SYMMETRIES)] for a in range(SYMMETRIES)]
+
+# GOAT_KEYS[t][i] and TIGER_KEYS[t][i] are the Zobrist keys of a goat or a tiger on point i after symmetry t
+GOAT_KEYS = [[ZOBRIST_GOAT[PERMUTATIONS[t][i]] for i in range(25)] for t in range(SYMMETRIES)]
+TIGER_KEYS = [[ZOBRIST_TIGER[PERMUTATIONS[t][i]] for i in range(25)] for t in range(SYMMETRIES)]
+
+
+# Image of a move under symmetry t, (x, y) for placing and ((x, y), (x, y)) for moving
+def transform_move(t, move):
+    if isinstance(move[0], tuple):
+        return transform_point(t, move[0]), transform_point(t, move[1])
+    return transform_point(t, move)
+
+
+# CODE_IMAGES[t][code] is the code of the image of the move with code under symmetry t (see Tree.encode_move)
+CODE_IMAGES = [[MOVE_CODES[transform_move(t, move)] if move is not None else 0 for move in MOVES]
+               for t in range(SYMMETRIES)]
+
+
+# Canonical key of a position and the symmetry that maps the position to its canonical image
+# The key is position_hash of the canonical image, it covers the board, the player to move and the goats in hand
+# The state can be any engine with piece_points
+def canonical_key(state):
+    goats, tigers = state.piece_points()
+    extra = ZOBRIST_GOATS_IN_HAND[state.goats]
+    if state.current_player == 'tiger':
+        extra ^= ZOBRIST_TIGER_TO_MOVE
+    best_key = None
+    best_t = 0
+    for t in range(SYMMETRIES):
+        goat_keys = GOAT_KEYS[t]
+        tiger_keys = TIGER_KEYS[t]
+        key = extra
+        for i in goats:
+            key ^= goat_keys[i]
+        for i in tigers:
+            key ^= tiger_keys[i]
+        if best_key is None or key < best_key:
+            best_key = key
+            best_t = t
+    return best_key, best_t
+
+
+# Symmetries other than the identity that map the position onto itself
+def stabilizer(state):
+    goats, tigers = state.piece_points()
+    goat_set, tiger_set = set(goats), set(tigers)
+    return [t for t in range(1, SYMMETRIES)
+            if {PERMUTATIONS[t][i] for i in tigers} == tiger_set and {PERMUTATIONS[t][i] for i in goats} == goat_set]
+
+
+# Moves of the state with only one move kept out of every group that leads to symmetric positions
+# The moves are kept in their order, the first move of a group stands for the group
+def unique_moves(state, moves):
+    symmetries = stabilizer(state)
+    if not symmetries:
+        return moves
+    seen = set()
+    unique = []
+    for move in moves:
+        if move in seen:
+            continue
+        unique.append(move)
+        seen.update(transform_move(t, move) for t in symmetries)
+    return unique
+
+
+# Image of a state under symmetry t, a new state of the same engine
+# The history only keeps the count of the current board, the boards of the other
+# entries are not known from their hashes, so they cannot be mapped
+def transform_state(state, t):
+    board, current_player, goats, goats_on_board, captured_goats, moves_since_progress, history = state.to_compact()
+    image = ['.'] * 25
+    for i, cell in enumerate(board):
+        image[PERMUTATIONS[t][i]] = cell
+    new_state = type(state).from_compact(("".join(image), current_player, goats, goats_on_board, captured_goats,
+                                          moves_since_progress, ()))
+    new_state.state_history = Counter({new_state.zobrist_key: state.state_history[state.zobrist_key]})
+    return new_state
+
+
+# Canonical image of a state and the symmetry t that maps the state to it
+# Moves of the image are mapped back to the state with transform_move(INVERSE[t], move)
+def canonical_state(state):
+    key, t = canonical_key(state)
+    return transform_state(state, t), t
+
+
+# Check that every symmetry keeps the lattice and that symmetric positions share their canonical key
+def check_symmetries(games=50, seed=0):
+    import random
+    from BitboardBaghchal import BitboardBaghchal
+    from BoardTables import NEIGHBOURS
+    from Zobrist import position_hash
+
+    for t in range(SYMMETRIES):
+        permutation = PERMUTATIONS[t]
+        assert sorted(permutation) == list(range(25))
+        for i in range(25):
+            assert {permutation[j] for j in NEIGHBOURS[i]} == NEIGHBOURS[permutation[i]]
+        for u in range(SYMMETRIES):
+            assert [PERMUTATIONS[COMPOSE[u][t]][i] for i in range(25)] == [PERMUTATIONS[u][j] for j in permutation]
+
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = BitboardBaghchal()
+        images = [BitboardBaghchal() for _ in range(SYMMETRIES)]
+        while not game.is_terminal()[0] and game.get_possible_moves():
+            key, t = canonical_key(game)
+            assert position_hash(images[t]) == key
+            canonical, u = canonical_state(game)
+            assert u == t and position_hash(canonical) == key and canonical.to_compact()[0] == images[t].to_compact()[0]
+            assert canonical.is_terminal() == game.is_terminal()
+            # every move leads to a position that one of the kept moves leads to
+            unique = unique_moves(game, game.get_possible_moves())
+            children = {}
+            for move in game.get_possible_moves():
+                child = game.clone()
+                child.apply_move(move)
+                children[move] = canonical_key(child)[0]
+            assert {children[move] for move in unique} == set(children.values())
+            for u, image in enumerate(images):
+                assert canonical_key(image)[0] == key
+                assert sorted(transform_move(u, move) for move in game.get_possible_moves()) == \
+                       sorted(image.get_possible_moves())
+            move = rng.choice(game.get_possible_moves())
+            game.apply_move(move)
+            for u, image in enumerate(images):
+                image.apply_move(transform_move(u, move))
+    return games
+
+
+if __name__ == "__main__":
+    print(f"{check_symmetries()} random games checked under {SYMMETRIES} symmetries")
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+import sys
+
+# Transposition table for MCTS
+# Maps the hash of a position (board, player to move and goats in hand) to the tree node of that position
+# When the search reaches a position it has already seen through another order of moves,
+# the new child slot points to the existing node, so both share the same statistics and children
+# The table has a bounded number of entries, the least recently used entry is dropped when it is full
+# A dropped position keeps its node in the tree, it is just not shared any more
+# MCTS stores node * SYMMETRIES + the symmetry from the node's position to the canonical image (see Symmetry.py),
+# which is always 0 when the table is keyed by position_hash
+
+
+class TranspositionTable:
+    def __init__(self, max_entries=1 << 18):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+
+    # Entry stored for a position hash, -1 if there is none
+    def lookup(self, key):
+        self.lookups += 1
+        node = self.entries.get(key, -1)
+        if node != -1:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return node
+
+    # Store the entry of a position, dropping the least recently used entry if the table is full
+    def store(self, key, node):
+        self.entries[key] = node
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # Remove every entry, used when a search starts a new tree or the nodes of the tree are renumbered
+    def clear(self):
+        self.entries.clear()
+
+
+    # Approximate memory used by the table in bytes
+    # The dictionary itself plus one key and one node index per entry
+    def memory_bytes(self):
+        return sys.getsizeof(self.entries) + len(self.entries) * (sys.getsizeof(1 << 63) + sys.getsizeof(1 << 20))
+
+    # Statistics of the table as a dict
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_bytes': self.memory_bytes(),
+        }
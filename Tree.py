@@ -0,0 +1,238 @@
+import math
+import random
+from array import array
+
+# Array backed tree for MCTS
+# Nodes are indexes into preallocated arrays instead of objects
+# Node 0 is the root, the children of a node are stored next to each other
+# from first_child[node] to first_child[node] + child_count[node]
+# Nodes do not keep a game state, MCTS rebuilds it by applying the moves from the root
+#
+# A child slot usually holds its own statistics and children, but with a transposition table
+# it can point to another node for the same position, which turns the tree into a graph
+# target[slot] is the node whose statistics and children are used for the slot, the slot itself by default
+# The win count of a node is from the side of the player who made the move into it,
+# so every node picks the child that is best for the player to move
+# Since a node can then have several parents, updates follow the path the search walked down
+# When the table is keyed by canonical_key (see Symmetry.py), the position of a slot can be a symmetric image
+# of the position of its target, symmetry[slot] is the symmetry from the target position to the slot position
+# The possible moves of a node are generated once, when the node is first expanded,
+# and written in random order into the child slots, which then work as the queue of untried moves
+
+
+# Moves are stored as small integers
+# A goat placement on point i is i * 26, a move from point src to point dest is src * 25 + dest
+# A move never has src == dest, so the two kinds of codes do not collide
+MOVES = [None] * 625
+MOVE_CODES = {}
+for src in range(25):
+    MOVES[src * 26] = divmod(src, 5)
+    for dest in range(25):
+        if src != dest:
+            MOVES[src * 25 + dest] = (divmod(src, 5), divmod(dest, 5))
+for code, move in enumerate(MOVES):
+    if move is not None:
+        MOVE_CODES[move] = code
+
+
+# Encode a move as an integer
+def encode_move(move):
+    return MOVE_CODES[move]
+
+# Decode an integer back to a move
+def decode_move(code):
+    return MOVES[code]
+
+
+# Result added to the win count of every node on a path while a worker is still searching it
+# It counts as a loss for the player who moved into the node, so other workers are pushed to other paths
+VIRTUAL_LOSS = -1
+
+
+class Tree:
+    def __init__(self, capacity):
+        # capacity is the maximum number of nodes, all arrays are allocated once here
+        self.capacity = capacity
+        # visit and win count of every node
+        self.visits = array('i', [0]) * capacity
+        self.wins = array('d', [0.0]) * capacity
+        # parent of every node, -1 for the root
+        # for a node shared by several parents, the parent it was first reserved under
+        self.parent = array('i', [-1]) * capacity
+        # node holding the statistics and children of every slot, set when the slot is reserved
+        self.target = array('i', [0]) * capacity
+        # symmetry from the position of target[slot] to the position of the slot, 0 for the same position
+        self.symmetry = array('B', [0]) * capacity
+        # move that led to the node, encoded with encode_move
+        self.move = array('H', [0]) * capacity
+        # first child and number of children expanded so far
+        self.first_child = array('i', [0]) * capacity
+        self.child_count = array('B', [0]) * capacity
+        # number of possible moves of the node, -1 if the moves were never generated
+        self.move_count = array('h', [-1]) * capacity
+        # Only the root is in use at the start
+        # size counts the reserved slots, untried moves included, nodes only the root and the expanded children
+        # that hold their own statistics, a slot that shares the node of another one is not counted
+        self.size = 1
+        self.nodes = 1
+
+
+    # Number of bytes used by one node
+    def bytes_per_node(self):
+        return sum(a.itemsize for a in (self.visits, self.wins, self.parent, self.target, self.symmetry, self.move,
+                                        self.first_child, self.child_count, self.move_count))
+
+    # Number of bytes used by the whole tree
+    def memory_bytes(self):
+        return self.capacity * self.bytes_per_node()
+
+
+    # Reserve one child slot for each possible move of a node
+    # The moves are shuffled with rng and written into the slots, expand takes them in that order
+    # Returns False if the tree is full, the node then stays a leaf
+    def reserve_children(self, node, moves, rng=random):
+        n = len(moves)
+        if self.size + n > self.capacity:
+            return False
+        first = self.size
+        self.first_child[node] = first
+        self.move_count[node] = n
+        self.size += n
+        self.target[first:first + n] = array('i', range(first, first + n))
+        codes = [MOVE_CODES[move] for move in moves]
+        rng.shuffle(codes)
+        for child, code in enumerate(codes, first):
+            self.parent[child] = node
+            self.move[child] = code
+        return True
+
+    # Expand the next untried move of a node
+    # Returns the new child, its move is decode_move(tree.move[child])
+    def expand(self, node):
+        child = self.first_child[node] + self.child_count[node]
+        self.child_count[node] += 1
+        self.nodes += 1
+        return child
+
+    # Make an expanded slot use the statistics and children of another node, see target and symmetry above
+    def share(self, slot, node, symmetry=0):
+        self.target[slot] = node
+        self.symmetry[slot] = symmetry
+        self.nodes -= 1
+
+
+    # Expanded children of a node as (slot, node) pairs, node is where the statistics of the slot are
+    def children(self, node):
+        first = self.first_child[node]
+        target = self.target
+        return [(slot, target[slot]) for slot in range(first, first + self.child_count[node])]
+
+    # Slot of the expanded child of a node for a move, -1 if the move was not expanded
+    def find_slot(self, node, move):
+        code = MOVE_CODES[move]
+        for slot, child in self.children(node):
+            if self.move[slot] == code:
+                return slot
+        return -1
+
+    # Node of the expanded child of a node for a move, -1 if the move was not expanded
+    def find_child(self, node, move):
+        slot = self.find_slot(node, move)
+        return self.target[slot] if slot != -1 else -1
+
+    # Copy the part of the tree reachable from a node into a new tree of the same capacity, with the node as root
+    # Child blocks are copied whole, so the untried moves of every node are kept
+    # A node shared by several slots is copied once and the other slots point to the copy
+    def extract_subtree(self, node):
+        tree = Tree(self.capacity)
+        node_fields = ('visits', 'wins', 'child_count', 'move_count')
+        for name in node_fields:
+            getattr(tree, name)[0] = getattr(self, name)[node]
+        copied = {node: 0}
+        stack = [(node, 0)]
+        while stack:
+            old, new = stack.pop()
+            n = self.move_count[old]
+            if n <= 0:
+                continue
+            old_first = self.first_child[old]
+            new_first = tree.size
+            tree.first_child[new] = new_first
+            tree.size += n
+            tree.move[new_first:new_first + n] = self.move[old_first:old_first + n]
+            tree.symmetry[new_first:new_first + n] = self.symmetry[old_first:old_first + n]
+            tree.parent[new_first:new_first + n] = array('i', [new]) * n
+            tree.target[new_first:new_first + n] = array('i', range(new_first, new_first + n))
+            # only the expanded children can have children of their own
+            for k in range(self.child_count[old]):
+                child = self.target[old_first + k]
+                if child in copied:
+                    tree.target[new_first + k] = copied[child]
+                    continue
+                copied[child] = new_first + k
+                for name in node_fields:
+                    getattr(tree, name)[new_first + k] = getattr(self, name)[child]
+                stack.append((child, new_first + k))
+        tree.nodes = len(copied)
+        return tree
+
+
+    # check if the node is fully expanded
+    # all the possible moves of the node have a child
+    def is_fully_expanded(self, node):
+        return self.child_count[node] == self.move_count[node]
+
+
+    # Get the slot of the best child of the node with UCB1, same formula as before
+    # target[slot] is the node to continue from
+    # exploitation is the win rate of the child
+    # exploration is the square root of the log of the visit of the parent divided by the visit of the child
+    def get_best_child(self, node, exploration_weight=1.41):
+        visits = self.visits
+        wins = self.wins
+        log_visit = math.log(visits[node]) if visits[node] > 0 else 0.0
+        target = self.target
+        best_child = -1
+        best_score = -float('inf')
+        first = self.first_child[node]
+        for slot in range(first, first + self.child_count[node]):
+            child = target[slot]
+            if visits[child] == 0:
+                continue
+            score = wins[child] / visits[child] + exploration_weight * math.sqrt(log_visit / visits[child])
+            if score > best_score:
+                best_score = score
+                best_child = slot
+        return best_child
+
+
+    # Update the visit and win count of every node on a path from the root
+    # count is the number of simulations the result is the sum of
+    # result is from the side of the player who moved into the first node of the path,
+    # the players take turns, so it changes sign at every node down the path
+    def backpropagate(self, path, result, count=1):
+        visits = self.visits
+        wins = self.wins
+        for node in path:
+            visits[node] += count
+            wins[node] += result
+            result = -result
+
+
+    # Virtual loss ........................................
+    # Used when several workers search the same tree
+    # The path is counted as visited and lost until the real result is known
+    def add_virtual_loss(self, path):
+        visits = self.visits
+        wins = self.wins
+        for node in path:
+            visits[node] += 1
+            wins[node] += VIRTUAL_LOSS
+
+    # Replace the virtual loss added on the path by the real result, from the same side as in backpropagate
+    # The visit was already counted by add_virtual_loss
+    def revert_virtual_loss(self, path, result):
+        wins = self.wins
+        for node in path:
+            wins[node] += result - VIRTUAL_LOSS
+            result = -result
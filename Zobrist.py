@@ -0,0 +1,38 @@
+import random
+
+# Zobrist keys for the 25 points of the board
+# A board is hashed by XOR-ing the key of every piece on it
+# Placing, moving or capturing a piece only XORs the keys of the points that changed
+# so the hash is updated in constant time after every move
+# The generator is seeded so the keys are the same in every process
+
+_rng = random.Random(0x5A0B1257)
+
+# ZOBRIST_GOAT[i] and ZOBRIST_TIGER[i] are the keys of a goat or a tiger on point i = x * 5 + y
+ZOBRIST_GOAT = [_rng.getrandbits(64) for _ in range(25)]
+ZOBRIST_TIGER = [_rng.getrandbits(64) for _ in range(25)]
+
+
+# Hash of a board given as lists of (x, y) for goats and tigers
+def zobrist_hash(goats, tigers):
+    key = 0
+    for x, y in goats:
+        key ^= ZOBRIST_GOAT[x * 5 + y]
+    for x, y in tigers:
+        key ^= ZOBRIST_TIGER[x * 5 + y]
+    return key
+
+
+# Keys for the rest of the position, used with the board hash to tell positions apart
+# in a transposition table: the player to move and the number of goats still to be placed
+ZOBRIST_TIGER_TO_MOVE = _rng.getrandbits(64)
+ZOBRIST_GOATS_IN_HAND = [_rng.getrandbits(64) for _ in range(21)]
+
+
+# Hash of a whole position: board, player to move and goats in hand
+# The captured goats follow from the board and the goats in hand, so they are not needed
+def position_hash(state):
+    key = state.zobrist_key ^ ZOBRIST_GOATS_IN_HAND[state.goats]
+    if state.current_player == 'tiger':
+        key ^= ZOBRIST_TIGER_TO_MOVE
+    return key
@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+
+from BatchRollout import batch_from_state, batch_rollout, play_batch, TIGER_WIN, GOAT_WIN, DRAW
+from Benchmark import suite_positions
+from BitboardBaghchal import BitboardBaghchal, compare_with_baghchal
+from RolloutPolicy import HeavyPolicy
+
+# Tests of the game engines
+# Run with: python -m pytest, or python test_engines.py without pytest
+
+
+# The bitboard engine agrees with the numpy engine on random games, see compare_with_baghchal
+def test_bitboard_matches_baghchal():
+    assert compare_with_baghchal(games=100, seed=0) == 100
+
+
+# Games played with a policy from the start, the moves are chosen with the state as it is played
+def policy_games(policy, games, seed=0):
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = BitboardBaghchal()
+        yield game
+        while not game.is_terminal()[0] and game.get_possible_moves():
+            game.apply_move(policy.choose_move(game, game.get_possible_moves(), rng))
+            yield game
+
+
+# Share of tiger wins, goat wins and draws of n uniform random games from a state played one at a time
+# Like play_batch, a game still going after max_plies plies is a draw
+def serial_outcomes(state, n, rng, max_plies=200):
+    counts = {'tiger': 0, 'goat': 0, None: 0}
+    for _ in range(n):
+        game = state.clone()
+        plies = 0
+        while not game.is_terminal()[0] and plies < max_plies:
+            moves = game.get_possible_moves()
+            if not moves:
+                break
+            game.apply_move(rng.choice(moves))
+            plies += 1
+        counts[game.is_terminal()[1]] += 1
+    return np.array([counts['tiger'], counts['goat'], counts[None]]) / n
+
+
+# Batched random games end like the same games played one at a time, within sampling noise,
+# from the suite positions and from positions of games where the goats avoid captures,
+# which end in goat wins and draws too
+# The batch does not track repeated positions, so the draws can differ a little
+def test_batch_outcomes_match_serial(playouts=2000, tolerance=0.04):
+    positions = list(suite_positions(BitboardBaghchal).values())
+    for ply, game in enumerate(policy_games(HeavyPolicy(), 1, seed=4)):
+        if ply == 30:
+            positions.append(game.clone())
+            break
+    for position in positions:
+        serial = serial_outcomes(position, playouts, random.Random(0))
+        batch = np.array(batch_rollout(position, playouts, np.random.default_rng(0))) / playouts
+        assert np.abs(serial - batch).max() < tolerance, (position.to_compact()[:6], serial, batch)
+
+
+# A finished position is scored with its result, without any move played,
+# and goats without moves end the game as a draw like the serial simulation
+def test_batch_scores_finished_positions():
+    results = {'tiger': TIGER_WIN, 'goat': GOAT_WIN, None: DRAW}
+    found = {}
+    for game in policy_games(HeavyPolicy(), 200):
+        if game.terminal_reason in ('captured', 'tigers_blocked', 'no_progress') and game.terminal_reason not in found:
+            found[game.terminal_reason] = game.clone()
+    assert set(found) == {'captured', 'tigers_blocked', 'no_progress'}
+    # Goats to move without any move, the only empty point is surrounded by tigers, which is a draw
+    board = ['G'] * 25
+    board[0 * 5 + 1] = '.'
+    for point in (0 * 5 + 0, 0 * 5 + 2, 1 * 5 + 1, 4 * 5 + 4):
+        board[point] = 'T'
+    found['no_moves'] = BitboardBaghchal.from_compact(("".join(board), 'goat', 0, 20, 0, 0, ()))
+    assert not found['no_moves'].is_terminal()[0] and not found['no_moves'].get_possible_moves()
+    for reason, game in found.items():
+        batch = batch_from_state(game, 8)
+        board = batch['board'].copy()
+        winner = play_batch(batch, np.random.default_rng(0))
+        assert (winner == results[game.is_terminal()[1]]).all(), reason
+        assert (batch['board'] == board).all() and (batch['goats'] == game.goats).all(), reason
+
+
+if __name__ == "__main__":
+    tests = [test for name, test in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        test()
+    print(f"{len(tests)} tests passed")
@@ -0,0 +1,222 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import inspect
+import os
+import random
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from Baghchal import Baghchal
+from Benchmark import benchmark_position, find_position
+from BitboardBaghchal import BitboardBaghchal
+from MCTS import search, root_statistics, MCTSSearcher, MAX_CHILDREN
+from MoveServer import _search_worker, MoveServer, MAX_ITERATIONS
+from OpeningBook import _book_worker, write_book, OpeningBook
+from ParallelMCTS import tree_parallel_search
+from Symmetry import canonical_key, transform_move, check_symmetries
+from Transposition import TranspositionTable
+from Tree import encode_move
+
+# Tests of the search
+# Run with: python -m pytest, or python test_search.py without pytest
+
+
+# The tree parallel search with one worker is deterministic
+# and gives the same tree as the serial search with the same random numbers
+def test_tree_parallel_one_worker_is_deterministic(iterations=300, seed=0):
+    game = benchmark_position(BitboardBaghchal)
+    first = root_statistics(tree_parallel_search(game, iterations, 1, seed))
+    second = root_statistics(tree_parallel_search(game, iterations, 1, seed))
+    assert first == second
+    worker_seed = random.Random(seed).getrandbits(32)
+    tree, stats = search(game, iterations, rng=random.Random(worker_seed))
+    assert root_statistics(tree) == first
+
+
+# Engine that checks every move it is given is legal in its position
+class CheckedBaghchal(BitboardBaghchal):
+    def apply_move(self, move):
+        assert move in self.get_possible_moves(), f"{move} is not legal in {self.to_compact()[:2]}"
+        return super().apply_move(move)
+
+
+# Every symmetry keeps the board lattice and symmetric positions share their canonical key
+def test_symmetries():
+    check_symmetries(games=20)
+
+
+# A search with symmetric positions sharing nodes through the table, kept between moves,
+# maps every move it applies back to a legal move of the game and leaves the game as it was
+def test_symmetric_search_plays_legal_moves(plies=24, iterations=300):
+    rng = random.Random(0)
+    game = CheckedBaghchal()
+    searcher = MCTSSearcher(1 + 2 * iterations * MAX_CHILDREN, random.Random(1), TranspositionTable(), symmetry=True)
+    for _ in range(plies):
+        if game.is_terminal()[0] or not game.get_possible_moves():
+            break
+        before = game.to_compact()
+        move, stats = searcher.search(game, iterations)
+        assert game.to_compact() == before and not game.is_terminal()[0]
+        assert move in game.get_possible_moves()
+        # Play the search move and random moves in turn, so the tree is reused and reset
+        if rng.random() < 0.5:
+            move = rng.choice(game.get_possible_moves())
+        game.apply_move(move)
+        searcher.advance(move)
+
+
+# After a move is played, the subtree of the move becomes the root with its visits
+def test_advance_keeps_the_subtree(iterations=500):
+    game = BitboardBaghchal()
+    searcher = MCTSSearcher(1 + 2 * iterations * MAX_CHILDREN, random.Random(0))
+    move, stats = searcher.search(game, iterations)
+    visits = searcher.tree.visits[searcher.tree.find_child(0, move)]
+    game.apply_move(move)
+    searcher.advance(move)
+    assert searcher.tree.visits[0] == visits > 0
+    assert searcher.root_state.to_compact() == game.to_compact()
+
+
+# A move that was never expanded leaves nothing to keep, the tree starts again
+def test_advance_unexpanded_move_resets(iterations=5):
+    game = BitboardBaghchal()
+    searcher = MCTSSearcher(1 + iterations * MAX_CHILDREN, random.Random(0))
+    searcher.search(game, iterations)
+    expanded = {searcher.tree.move[slot] for slot, child in searcher.tree.children(0)}
+    move = next(move for move in game.get_possible_moves() if encode_move(move) not in expanded)
+    searcher.advance(move)
+    assert searcher.tree.visits[0] == 0 and searcher.tree.size == 1 and searcher.root_state is None
+
+
+# A subtree with nodes shared through the table is copied with every shared node once
+def test_extract_subtree_with_shared_nodes(iterations=2000):
+    game = find_position(Baghchal, lambda game: game.goats == 0 and game.current_player == 'goat')
+    tree, stats = search(game, iterations, rng=random.Random(0), table=TranspositionTable())
+    assert stats['transpositions']['hits'] > 0
+    slot, child = max(tree.children(0), key=lambda pair: tree.visits[pair[1]])
+    subtree = tree.extract_subtree(child)
+    assert subtree.visits[0] == tree.visits[child] and subtree.wins[0] == tree.wins[child]
+    targets = {0}
+    stack = [0]
+    while stack:
+        for slot, node in subtree.children(stack.pop()):
+            assert node < subtree.size
+            if node not in targets:
+                targets.add(node)
+                stack.append(node)
+    assert subtree.nodes == len(targets)
+
+
+# A search with the table leaves the game as it was, also in the movement phase where shared nodes
+# can lead back to a node on the path, and every hit is one of the lookups
+def test_table_search_restores_the_game(iterations=2000):
+    game = find_position(Baghchal, lambda game: game.goats == 0 and game.current_player == 'goat')
+    before = game.to_compact()
+    table = TranspositionTable()
+    tree, stats = search(game, iterations, rng=random.Random(0), table=table)
+    assert game.to_compact() == before
+    counts = stats['transpositions']
+    assert 0 < counts['hits'] <= counts['lookups'] and counts['entries'] <= tree.nodes
+
+
+# The least recently used entry is dropped once the table has more than max_entries
+def test_table_evicts_least_recently_used(iterations=500):
+    table = TranspositionTable(max_entries=2)
+    table.store(1, 10)
+    table.store(2, 20)
+    assert table.lookup(1) == 10
+    table.store(3, 30)
+    assert table.evictions == 1 and table.lookup(2) == -1 and table.lookup(1) == 10 and table.lookup(3) == 30
+
+    table = TranspositionTable(max_entries=50)
+    tree, stats = search(BitboardBaghchal(), iterations, rng=random.Random(0), table=table)
+    assert stats['transpositions']['entries'] == 50 and stats['transpositions']['evictions'] > 0
+
+
+# Goat moves of the game after which the tigers are blocked, the goats win with any of them
+def blocking_moves(game):
+    moves = []
+    for move in game.get_possible_moves():
+        child = game.clone()
+        child.apply_move(move)
+        if child.terminal_reason == 'tigers_blocked':
+            moves.append(move)
+    return moves
+
+# Movement phase position, goat to move, where the goats can block the tigers
+def blocking_position():
+    game = find_position(Baghchal, lambda game: game.current_player == 'goat' and game.goats == 0
+                         and bool(blocking_moves(game)))
+    return BitboardBaghchal.from_compact(game.to_compact())
+
+
+# The move server answers a goat position with a move for the goats
+def test_server_plays_goat_blocking_win():
+    game = blocking_position()
+    move, iterations, seconds = _search_worker('bitboard', game.to_compact(), 2000, None, 0)
+    assert move in blocking_moves(game)
+
+
+# Requests are bounded by the server time limit, even when they only give iterations,
+# and more than MAX_ITERATIONS iterations are refused
+def test_server_bounds_every_search():
+    server = MoveServer(1, max_time_limit=0.2)
+    # Searches run in a thread here, find_move only needs an executor
+    server.pool = ThreadPoolExecutor(1)
+    position = {'board': 'T...T' + '.' * 15 + 'T...T', 'player': 'goat', 'goats': 20, 'captured': 0}
+    try:
+        answer = asyncio.run(server.find_move({'position': position, 'iterations': MAX_ITERATIONS}))
+        assert answer['source'] == 'search' and answer['iterations'] < MAX_ITERATIONS and answer['seconds'] < 1.0
+        try:
+            asyncio.run(server.find_move({'position': position, 'iterations': MAX_ITERATIONS + 1}))
+        except ValueError:
+            pass
+        else:
+            assert False, "too many iterations were accepted"
+    finally:
+        server.close()
+
+
+# A book built from a goat position stores the move that wins for the goats
+def test_book_stores_goat_blocking_win(tmp_path):
+    game = blocking_position()
+    path = os.path.join(tmp_path, 'book.npy')
+    key, move = _book_worker(game.to_compact(), 2000, 0)
+    write_book(path, [key], [move])
+    assert OpeningBook(path).lookup(game) in blocking_moves(game)
+
+
+# A lookup in a large book reads the memory mapped keys in place, it does not copy them
+def test_book_lookup_does_not_copy(tmp_path, records=2000000):
+    game = BitboardBaghchal()
+    key, t = canonical_key(game)
+    move = game.get_possible_moves()[0]
+    keys = np.unique(np.append(np.random.default_rng(0).integers(0, 1 << 63, records, dtype=np.uint64), key))
+    moves = np.zeros(len(keys), dtype=np.uint16)
+    moves[np.searchsorted(keys, key)] = encode_move(transform_move(t, move))
+    path = os.path.join(tmp_path, 'book.npy')
+    write_book(path, keys, moves)
+    del keys, moves
+
+    book = OpeningBook(path)
+    tracemalloc.start()
+    try:
+        assert book.lookup(game) == move
+        assert book.lookup(BitboardBaghchal.from_compact(blocking_position().to_compact())) is None
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < records
+
+
+if __name__ == "__main__":
+    # Without pytest, tests that take the tmp_path fixture get a new temporary directory
+    tests = [test for name, test in sorted(globals().items()) if name.startswith('test_')]
+    for test in tests:
+        if 'tmp_path' in inspect.signature(test).parameters:
+            test(tempfile.mkdtemp())
+        else:
+            test()
+    print(f"{len(tests)} tests passed")